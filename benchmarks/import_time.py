@@ -0,0 +1,51 @@
+"""Measure how long it takes to import Montague's modules, and to parse the first
+formula after importing.
+
+Each measurement is made in a fresh interpreter, and the best of several runs
+is reported.
+
+Usage: python3 benchmarks/import_time.py [runs]
+"""
+import os
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+MEASUREMENTS = [
+    ('import montague.parser', 'import montague.parser'),
+    ('import montague.translator', 'import montague.translator'),
+    ('import montague.interpreter', 'import montague.interpreter'),
+    ('import montague.main', 'import montague.main'),
+    (
+        'first parse_formula',
+        'from montague.parser import parse_formula; parse_formula("Lx.Good(x)")',
+    ),
+]
+
+TEMPLATE = '''\
+import time
+start = time.perf_counter()
+{}
+print(time.perf_counter() - start)
+'''
+
+
+def measure(statement, runs):
+    times = []
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, '-c', TEMPLATE.format(statement)], cwd=PROJECT_DIR
+        )
+        times.append(float(output))
+    return min(times)
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for name, statement in MEASUREMENTS:
+        print('{:30} {:8.1f} ms'.format(name, measure(statement, runs) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Measure the memory used by translations: the peak memory used while building
+the chart of a long sentence, and the memory kept by translated sentences.
+
+Memory is measured with tracemalloc, so only memory allocated by Python is
+counted.
+
+Usage: python3 benchmarks/memory.py [clauses]
+"""
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from montague.translator import (
+    build_chart,
+    load_lexicon,
+    lookup_words,
+    translate_sentence,
+)
+
+FRAGMENT_PATH = os.path.join(PROJECT_DIR, 'montague', 'resources', 'fragment.json')
+
+CLAUSES = ['John is good', 'every child is bad', 'the child is good']
+
+
+def sentence_of(clauses):
+    return ' and '.join(CLAUSES[i % len(CLAUSES)] for i in range(clauses))
+
+
+def measure_chart(lexicon, clauses):
+    terms = lookup_words(sentence_of(clauses), lexicon)
+    gc.collect()
+    tracemalloc.start()
+    build_chart(terms)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(terms), peak
+
+
+def measure_translations(lexicon, count):
+    # The sentences are kept alive so that their memory can be measured.
+    sentences = [sentence_of(1 + i % 5) for i in range(count)]
+    gc.collect()
+    tracemalloc.start()
+    translations = [translate_sentence(sentence, lexicon) for sentence in sentences]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current / len(translations)
+
+
+def main():
+    clauses = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    with open(FRAGMENT_PATH) as f:
+        lexicon = load_lexicon(json.load(f))
+
+    words, peak = measure_chart(lexicon, clauses)
+    print('chart of {} words: {:.1f} KiB peak'.format(words, peak / 1024))
+    per_translation = measure_translations(lexicon, 2000)
+    print('translated sentence: {:.0f} bytes kept'.format(per_translation))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,8 @@ Sentences: SentenceNode
 Author:  Ian Fisher (iafisher@protonmail.com)
 Version: September 2018
 """
+import threading
+import weakref
 from collections import namedtuple
 
 
@@ -15,27 +17,180 @@ from collections import namedtuple
 
 
 class Formula:
+    """The base class of logical formulas.
+
+    Formulas are immutable and hash-consed: constructing a formula that is
+    structurally identical to one that already exists returns the existing
+    object, so two formulas are equal if and only if they are the same object.
+    Equality tests and hashing therefore take constant time no matter how large
+    the formulas are, and identical subformulas share memory.
+
+    Each subclass lists the names of its children in `_fields`, and the children
+    can be accessed by name or by iterating over the formula.
+    """
+
+    __slots__ = ('_free_variables', '_simplified', '__weakref__')
+    _fields = ()
+
+    def __new__(cls, *args, **kwargs):
+        if kwargs:
+            try:
+                args += tuple(kwargs.pop(field) for field in cls._fields[len(args) :])
+            except KeyError as e:
+                raise TypeError('{}() missing argument {}'.format(cls.__name__, e))
+        if kwargs or len(args) != len(cls._fields):
+            raise TypeError(
+                '{}() takes {} arguments'.format(cls.__name__, len(cls._fields))
+            )
+
+        key = (cls,) + args
+        with _interned_lock:
+            formula = _interned.get(key)
+            if formula is None:
+                formula = object.__new__(cls)
+                for field, value in zip(cls._fields, args):
+                    object.__setattr__(formula, field, value)
+                _interned[key] = formula
+        return formula
+
+    def __setattr__(self, name, value):
+        raise AttributeError('formulas are immutable')
+
+    def __iter__(self):
+        return (getattr(self, field) for field in self._fields)
+
+    def __reduce__(self):
+        # Unpickled and copied formulas go through __new__ so that they are
+        # interned.
+        return (self.__class__, tuple(self))
+
+    def __repr__(self):
+        return '{}({})'.format(
+            self.__class__.__name__,
+            ', '.join('{}={!r}'.format(f, getattr(self, f)) for f in self._fields),
+        )
+
     def replace_variable(self, variable, replacement):
         """Replace all unbound instances of `variable`, a string, with
         `replacement`.
 
-        The default implementation recursively replaces the variable in all
-        children. Subclasses may need to override this implementation.
+        Subtrees in which `variable` does not occur free are returned as they
+        are, without being traversed.
         """
-        children = [
-            c.replace_variable(variable, replacement) if isinstance(c, Formula) else c
-            for c in self
-        ]
-        return self.__class__(*children)
+        # The tree is traversed with an explicit stack rather than by recursion,
+        # so that arbitrarily deep formulas can be handled. `replaced` maps each
+        # subtree that has been visited to its replacement.
+        replaced = {}
+        stack = [self]
+        while stack:
+            formula = stack[-1]
+            if formula in replaced:
+                stack.pop()
+            elif variable not in formula.free_variables():
+                replaced[formula] = formula
+                stack.pop()
+            elif isinstance(formula, Var):
+                replaced[formula] = replacement
+                stack.pop()
+            else:
+                pending = [
+                    c for c in formula if isinstance(c, Formula) and c not in replaced
+                ]
+                if pending:
+                    stack.extend(pending)
+                else:
+                    replaced[formula] = formula._rebuild(
+                        [replaced[c] if isinstance(c, Formula) else c for c in formula]
+                    )
+                    stack.pop()
+        return replaced[self]
 
     def simplify(self):
         """Simplify the tree by lambda conversion.
 
-        The default implementation recursively simplifies each child. Subclasses
-        may need to override this implementation.
+        Reduction is done on a nameless representation of the formula (see
+        reduction.py), so it never captures variables. Bound variables keep
+        their names unless they would capture a variable, in which case they
+        are primed.
+
+        The result is cached on the node, so simplifying a formula that has
+        already been simplified (or that is itself the result of simplification)
+        does not traverse it again.
         """
-        children = [c.simplify() if isinstance(c, Formula) else c for c in self]
-        return self.__class__(*children)
+        # Imported here because the reduction module depends on this one.
+        from .reduction import simplify_formula
+
+        # `_simplified` is None if the formula is its own simplification (rather
+        # than a reference to itself, which would keep it alive).
+        try:
+            simplified = self._simplified
+        except AttributeError:
+            pass
+        else:
+            return self if simplified is None else simplified
+
+        simplified = simplify_formula(self)
+        if simplified is self:
+            object.__setattr__(self, '_simplified', None)
+        else:
+            object.__setattr__(self, '_simplified', simplified)
+            # A simplified formula is its own simplification.
+            try:
+                simplified._simplified
+            except AttributeError:
+                object.__setattr__(simplified, '_simplified', None)
+        return simplified
+
+    def _rebuild(self, children):
+        """Return a formula of the same class as this one with the given
+        children, or this formula itself if none of them have changed.
+        """
+        if all(new is old for new, old in zip(children, self)):
+            return self
+        else:
+            return self.__class__(*children)
+
+    def free_variables(self):
+        """Return the set of variables that occur free in the formula, as a
+        frozenset of strings. Note that constants like the `Good` in `Good(x)`
+        count as free variables.
+
+        The result is computed once and then cached on the node.
+        """
+        try:
+            return self._free_variables
+        except AttributeError:
+            pass
+
+        # Compute the free variables of the children before their parents, so
+        # that _compute_free_variables never has to recurse.
+        stack = [self]
+        while stack:
+            formula = stack[-1]
+            pending = [
+                c
+                for c in formula
+                if isinstance(c, Formula) and not hasattr(c, '_free_variables')
+            ]
+            if pending:
+                stack.extend(pending)
+            else:
+                stack.pop()
+                if not hasattr(formula, '_free_variables'):
+                    object.__setattr__(
+                        formula, '_free_variables', formula._compute_free_variables()
+                    )
+        return self._free_variables
+
+    def _compute_free_variables(self):
+        # The default implementation takes the union of the free variables of
+        # the children. Subclasses that bind variables must override it.
+        return frozenset().union(
+            *(c.free_variables() for c in self if isinstance(c, Formula))
+        )
+
+    def __str__(self):
+        return _join(self._pieces())
 
     def ascii_str(self):
         """Render the formula as a string containing only ASCII characters.
@@ -45,160 +200,159 @@ class Formula:
         """
         return str(self)
 
+    def _pieces(self):
+        """Return the list of the pieces of the formula's string representation,
+        in order. Each piece is either a string or a Formula object, which
+        stands for the string representation of that formula.
 
-class Var(Formula, namedtuple('Var', ['value'])):
+        Formulas are converted to strings this way, rather than by recursively
+        calling __str__, so that arbitrarily deep formulas can be printed.
+        """
+        raise NotImplementedError
+
+
+class Var(Formula):
+    __slots__ = _fields = ('value',)
     prec = 1
 
-    def __str__(self):
-        return self.value
+    def _pieces(self):
+        return [self.value]
 
-    def replace_variable(self, variable, replacement):
-        return self if variable != self.value else replacement
+    def _compute_free_variables(self):
+        return frozenset([self.value])
 
 
-class And(Formula, namedtuple('And', ['left', 'right'])):
+class And(Formula):
+    __slots__ = _fields = ('left', 'right')
     prec = 2
 
-    def __str__(self):
-        # wrapb applies brackets if needed for the proper precedence.
-        left = wrapb(self, self.left)
-        right = wrapb(self, self.right)
-        return left + ' & ' + right
+    def _pieces(self):
+        # _wrapb applies brackets if needed for the proper precedence.
+        return _wrapb(self, self.left) + [' & '] + _wrapb(self, self.right)
 
 
-class Or(Formula, namedtuple('Or', ['left', 'right'])):
+class Or(Formula):
+    __slots__ = _fields = ('left', 'right')
     prec = 3
 
-    def __str__(self):
-        left = wrapb(self, self.left)
-        right = wrapb(self, self.right)
-        return left + ' | ' + right
+    def _pieces(self):
+        return _wrapb(self, self.left) + [' | '] + _wrapb(self, self.right)
 
 
-class IfThen(Formula, namedtuple('IfThen', ['left', 'right'])):
+class IfThen(Formula):
+    __slots__ = _fields = ('left', 'right')
     prec = 4
 
-    def __str__(self):
-        left = wrapb(self, self.left)
-        right = wrapb(self, self.right)
-        return left + ' -> ' + right
+    def _pieces(self):
+        return _wrapb(self, self.left) + [' -> '] + _wrapb(self, self.right)
 
 
-class IfAndOnlyIf(Formula, namedtuple('IfAndOnlyIf', ['left', 'right'])):
+class IfAndOnlyIf(Formula):
+    __slots__ = _fields = ('left', 'right')
     prec = 4
 
-    def __str__(self):
-        left = wrapb(self, self.left)
-        right = wrapb(self, self.right)
-        return left + ' <-> ' + right
+    def _pieces(self):
+        return _wrapb(self, self.left) + [' <-> '] + _wrapb(self, self.right)
 
 
-class Not(Formula, namedtuple('Not', ['operand'])):
+class Not(Formula):
+    __slots__ = _fields = ('operand',)
     prec = 1
 
-    def __str__(self):
-        operand = wrapb(self, self.operand)
-        return '~' + operand
+    def _pieces(self):
+        return ['~'] + _wrapb(self, self.operand)
 
 
-class Lambda(Formula, namedtuple('Lambda', ['parameter', 'body'])):
+class Lambda(Formula):
+    __slots__ = _fields = ('parameter', 'body')
     prec = 5
 
-    def __str__(self):
-        return 'λ{0.parameter}.{0.body}'.format(self)
+    def _pieces(self):
+        return ['λ', self.parameter, '.', self.body]
 
     def ascii_str(self):
-        return 'L{0.parameter}.{0.body}'.format(self)
+        return _join(['L', self.parameter, '.', self.body])
 
-    def replace_variable(self, variable, replacement):
-        if variable != self.parameter:
-            return Lambda(
-                self.parameter, self.body.replace_variable(variable, replacement)
-            )
-        else:
-            return self
+    def _compute_free_variables(self):
+        return self.body.free_variables() - {self.parameter}
 
 
-class Call(Formula, namedtuple('Call', ['caller', 'arg'])):
+class Call(Formula):
+    __slots__ = _fields = ('caller', 'arg')
     prec = 1
 
-    def __str__(self):
+    def _pieces(self):
         # To make string representations more natural, F(x)(y) is printed as
         # F(x, y), which is why this method is more complicated than you would
         # expect.
-        args = [str(self.arg)]
+        args = [self.arg]
         func = self.caller
         while isinstance(func, Call):
-            args.append(str(func.arg))
+            args.append(func.arg)
             func = func.caller
-        args = ', '.join(reversed(args))
         if isinstance(func, Var):
-            return '{}({})'.format(func, args)
+            pieces = [func, '(']
         else:
             # Syntactically, a non-constant function must be in parentheses in
             # a call expression.
-            return '({})({})'.format(func, args)
+            pieces = ['(', func, ')(']
+        for i, arg in enumerate(reversed(args)):
+            if i > 0:
+                pieces.append(', ')
+            pieces.append(arg)
+        pieces.append(')')
+        return pieces
 
-    def simplify(self):
-        caller = self.caller.simplify()
-        arg = self.arg.simplify()
-        if isinstance(caller, Lambda):
-            return caller.body.replace_variable(caller.parameter, arg).simplify()
-        else:
-            return Call(self.caller, arg)
 
-
-class ForAll(Formula, namedtuple('ForAll', ['symbol', 'body'])):
+class ForAll(Formula):
+    __slots__ = _fields = ('symbol', 'body')
     prec = 5
 
-    def __str__(self):
-        return '∀ {0.symbol}.{0.body}'.format(self)
+    def _pieces(self):
+        return ['∀ ', self.symbol, '.', self.body]
 
     def ascii_str(self):
-        return 'A{0.symbol}.{0.body}'.format(self)
+        return _join(['A', self.symbol, '.', self.body])
 
-    def replace_variable(self, variable, replacement):
-        if variable != self.symbol:
-            return ForAll(
-                self.symbol, self.body.replace_variable(variable, replacement)
-            )
-        else:
-            return self
+    def _compute_free_variables(self):
+        return self.body.free_variables() - {self.symbol}
 
 
-class Exists(Formula, namedtuple('Exists', ['symbol', 'body'])):
+class Exists(Formula):
+    __slots__ = _fields = ('symbol', 'body')
     prec = 5
 
-    def __str__(self):
-        return '∃ {0.symbol}.{0.body}'.format(self)
+    def _pieces(self):
+        return ['∃ ', self.symbol, '.', self.body]
 
     def ascii_str(self):
-        return 'E{0.symbol}.{0.body}'.format(self)
+        return _join(['E', self.symbol, '.', self.body])
 
-    def replace_variable(self, variable, replacement):
-        if variable != self.symbol:
-            return Exists(
-                self.symbol, self.body.replace_variable(variable, replacement)
-            )
-        else:
-            return self
+    def _compute_free_variables(self):
+        return self.body.free_variables() - {self.symbol}
 
 
-class Iota(Formula, namedtuple('Iota', ['symbol', 'body'])):
+class Iota(Formula):
+    __slots__ = _fields = ('symbol', 'body')
     prec = 5
 
-    def __str__(self):
-        return 'ι{0.symbol}.{0.body}'.format(self)
+    def _pieces(self):
+        return ['ι', self.symbol, '.', self.body]
 
     def ascii_str(self):
         # 'i' instead of 'ι'
-        return 'i{0.symbol}.{0.body}'.format(self)
+        return _join(['i', self.symbol, '.', self.body])
+
+    def _compute_free_variables(self):
+        return self.body.free_variables() - {self.symbol}
 
-    def replace_variable(self, variable, replacement):
-        if variable != self.symbol:
-            return Iota(self.symbol, self.body.replace_variable(variable, replacement))
-        else:
-            return self
+
+# The table of all formulas that currently exist, for hash-consing. The keys are
+# tuples of a Formula subclass and the children of a formula of that class.
+# Since the children are themselves interned, hashing a key only hashes the
+# identities of the children rather than recursing into them.
+_interned = weakref.WeakValueDictionary()
+_interned_lock = threading.Lock()
 
 
 # Below are defined the classes to represent semantic types as trees.
@@ -236,16 +390,104 @@ TYPE_EVENT = AtomicType('v')
 TYPE_WORLD = AtomicType('s')
 
 
-# The class to represent English sentences as logical formulas. `text` is the
-# English text corresponding to the node.
-SentenceNode = namedtuple('SentenceNode', ['text', 'formula', 'type'])
+class SentenceNode:
+    """The class to represent English sentences as logical formulas. `text` is
+    the English text corresponding to the node.
+
+    Rather than a copy of its text, each node holds a tuple of words, which is
+    shared by all the nodes for the same sentence, and the offsets `start` and
+    `end` of its words in the tuple. Nodes are immutable, and are equal if their
+    text, formulas and types are equal.
+    """
+
+    __slots__ = ('words', 'start', 'end', 'formula', 'type')
+
+    def __new__(cls, text, formula, type):
+        return cls.from_words((text,), 0, 1, formula, type)
+
+    @classmethod
+    def from_words(cls, words, start, end, formula, type_):
+        """Return the node for words[start:end], where `words` is a tuple of
+        strings.
+        """
+        node = object.__new__(cls)
+        object.__setattr__(node, 'words', words)
+        object.__setattr__(node, 'start', start)
+        object.__setattr__(node, 'end', end)
+        object.__setattr__(node, 'formula', formula)
+        object.__setattr__(node, 'type', type_)
+        return node
+
+    @property
+    def text(self):
+        return ' '.join(self.words[self.start : self.end])
+
+    def _replace(self, **kwargs):
+        """Return a copy of the node with the given fields replaced, like the
+        method of namedtuples.
+        """
+        text = kwargs.pop('text', None)
+        formula = kwargs.pop('formula', self.formula)
+        type_ = kwargs.pop('type', self.type)
+        if kwargs:
+            raise ValueError('Got unexpected field names: {!r}'.format(list(kwargs)))
+        if text is None:
+            return self.from_words(self.words, self.start, self.end, formula, type_)
+        else:
+            return self.__class__(text, formula, type_)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('sentence nodes are immutable')
+
+    def __iter__(self):
+        return iter((self.text, self.formula, self.type))
+
+    def __eq__(self, other):
+        if not isinstance(other, SentenceNode):
+            return NotImplemented
+        if self.formula != other.formula or self.type != other.type:
+            return False
+        # Nodes for the same span of the same sentence have the same text, which
+        # then need not be built.
+        same_span = self.words is other.words and (self.start, self.end) == (
+            other.start,
+            other.end,
+        )
+        return same_span or self.text == other.text
+
+    def __hash__(self):
+        return hash((self.text, self.formula, self.type))
+
+    def __reduce__(self):
+        return (self.__class__, tuple(self))
+
+    def __repr__(self):
+        return 'SentenceNode(text={!r}, formula={!r}, type={!r})'.format(*self)
 
 
 def wrapb(parent, child):
     """Return the child node as a string, wrapped in brackets if its precedence
     is higher than the parent node.
     """
+    return _join(_wrapb(parent, child))
+
+
+def _wrapb(parent, child):
+    # Like wrapb, but return a list of pieces (see Formula._pieces).
     if child.prec > parent.prec:
-        return '[{}]'.format(child)
+        return ['[', child, ']']
     else:
-        return str(child)
+        return [child]
+
+
+def _join(pieces):
+    """Join a list of pieces (see Formula._pieces) into a single string."""
+    strings = []
+    stack = list(reversed(pieces))
+    while stack:
+        piece = stack.pop()
+        if isinstance(piece, str):
+            strings.append(piece)
+        else:
+            stack.extend(reversed(piece._pieces()))
+    return ''.join(strings)
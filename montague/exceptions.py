@@ -13,6 +13,10 @@ class LexiconError(Exception):
     """When the lexicon is ill-formatted."""
 
 
+class NormalizationError(Exception):
+    """When a formula has no normal form within the step limit."""
+
+
 class ParseError(Exception):
     """When a formula or type could not be parsed."""
 
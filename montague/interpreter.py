@@ -4,67 +4,998 @@ of the world.
 Author:  Ian Fisher (iafisher@protonmail.com)
 Version: August 2018
 """
+import functools
+import itertools
 from collections import namedtuple
 
 from .ast import *
 
+# NumPy is only imported once an ArrayWorldModel is created (see _import_numpy),
+# so that processes that never use one do not pay for importing it.
+numpy = None
+
+
+def _import_numpy():
+    global numpy
+    if numpy is None:
+        import numpy
+    return numpy
+
 
 WorldModel = namedtuple('WorldModel', ['individuals', 'assignments'])
 
 
+class ArrayWorldModel(
+    namedtuple('ArrayWorldModel', ['individuals', 'assignments', 'index'])
+):
+    """A model of the world whose unary predicates are stored as boolean NumPy
+    arrays, for large domains.
+
+    The individuals are numbered from 0 to n-1 in the order given, and `index`
+    maps each individual to its number. Every value in `assignments` that is
+    either a boolean array of length n or a set of individuals is stored as a
+    PredicateArray; other values are kept as they are. Quantifiers over such
+    models are evaluated with whole-array operations where possible (see the
+    query planner below), and otherwise give the same results as they would
+    for the equivalent WorldModel.
+
+    Requires NumPy.
+    """
+
+    def __new__(cls, individuals, assignments):
+        try:
+            _import_numpy()
+        except ImportError:
+            raise ImportError('ArrayWorldModel requires NumPy')
+
+        individuals = tuple(individuals)
+        index = {individual: i for i, individual in enumerate(individuals)}
+        assignments = {
+            key: _to_predicate_array(value, individuals, index)
+            for key, value in assignments.items()
+        }
+        return super().__new__(cls, individuals, assignments, index)
+
+    def __getnewargs__(self):
+        return self.individuals, self.assignments
+
+
+class PredicateArray:
+    """The extension of a unary predicate in an ArrayWorldModel: a boolean array
+    whose i'th element is True if the i'th individual is in the extension.
+
+    Supports `in`, `len` and iteration like a set of individuals.
+    """
+
+    __slots__ = ['array', 'individuals', 'index']
+
+    def __init__(self, array, individuals, index):
+        self.array = array
+        self.individuals = individuals
+        self.index = index
+
+    def __contains__(self, individual):
+        i = self.index.get(individual)
+        return i is not None and bool(self.array[i])
+
+    def __iter__(self):
+        # The methods of the array are used rather than the functions of the
+        # numpy module, which is not imported when an array is unpickled on its
+        # own.
+        return (self.individuals[i] for i in self.array.nonzero()[0])
+
+    def __len__(self):
+        return int(self.array.sum())
+
+
+def _to_predicate_array(value, individuals, index):
+    if isinstance(value, PredicateArray):
+        value = value.array
+
+    if isinstance(value, numpy.ndarray):
+        if value.dtype == bool and value.shape == (len(individuals),):
+            return PredicateArray(value, individuals, index)
+    elif isinstance(value, (set, frozenset)):
+        try:
+            positions = [index[individual] for individual in value]
+        except (KeyError, TypeError):
+            # Not a set of individuals, so not a predicate extension.
+            return value
+        array = numpy.zeros(len(individuals), dtype=bool)
+        array[positions] = True
+        return PredicateArray(array, individuals, index)
+
+    return value
+
+
 def interpret_formula(formula, model):
     """Given a logical formula and a model of the world, return the formula's
     denotation in the model.
     """
+    return compile_formula(formula)(model)
+
+
+def interpret_many(formulas, model):
+    """Return a list of the denotations of each formula in `formulas` in the
+    model, in order.
+
+    This is equivalent to calling interpret_formula on each formula, except that
+    quantified subformulas and definite descriptions with no free variables
+    (e.g., the ιx.Child(x) in Good(ιx.Child(x))) are only evaluated once for the
+    whole batch, however many of the formulas they occur in.
+    """
+    memo = {}
+    return [_compile_cached(formula, ())(model, memo, ()) for formula in formulas]
+
+
+def interpret_across_models(formula, models, workers=None, chunksize=16):
+    """Return a list of the denotations of `formula` in each model in `models`,
+    in order.
+
+    If `workers` is greater than 1, the models are evaluated in a pool of that
+    many processes. The formula is sent to and compiled by each process once,
+    and the models are sent in chunks of `chunksize`. The models (and the
+    denotations, which are usually truth values) must be picklable. Otherwise,
+    or if `workers` is None or 1, the models are evaluated one after the other
+    in this process, with exactly the same results.
+    """
+    if workers is None or workers <= 1:
+        evaluate = compile_formula(formula)
+        return [evaluate(model) for model in models]
+
+    # Imported here since most processes never start a pool.
+    import multiprocessing
+
+    with multiprocessing.Pool(
+        workers, initializer=_initialize_worker, initargs=(formula,)
+    ) as pool:
+        return list(pool.imap(_evaluate_in_worker, models, chunksize))
+
+
+# The compiled formula in a worker process of interpret_across_models.
+_worker_formula = None
+
+
+def _initialize_worker(formula):
+    global _worker_formula
+    _worker_formula = compile_formula(formula)
+
+
+def _evaluate_in_worker(model):
+    return _worker_formula(model)
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_formula(formula):
+    """Compile `formula` into a function that takes a model of the world and
+    returns the formula's denotation in the model, exactly as interpret_formula
+    would.
+
+    The formula tree is only walked once, when it is compiled, so evaluating
+    the compiled function (particularly the bodies of quantifiers, which are
+    evaluated once per individual) does not pay for dispatching on the type of
+    each node. Compiled formulas are cached.
+    """
+    compiled = _compile_cached(formula, ())
+
+    def evaluate(model):
+        return compiled(model, {}, ())
+
+    return evaluate
+
+
+def _compile(formula, bound=()):
+    """Compile `formula` into a function that takes a model, a memo (see
+    _memoise) and an environment, and returns the formula's denotation.
+
+    `bound` is the tuple of the variables bound by the quantifiers that enclose
+    the formula, from outermost to innermost. The environment is a tuple of the
+    values currently assigned to those variables, in the same order. Variables
+    that are not bound by a quantifier are looked up in the model's assignments.
+
+    Quantifiers evaluate their bodies in an extended environment rather than by
+    temporarily assigning to the bound variable in the model, so evaluation
+    never modifies the model, and a model can be shared by any number of
+    concurrent evaluations.
+    """
+    evaluate = _compile_node(formula, bound)
+
+    if isinstance(formula, (ForAll, Exists, Iota)):
+        # If the formula does not depend on the variable bound by the innermost
+        # enclosing quantifier, then it has the same value on many iterations of
+        # that quantifier's loop, and it is worth remembering its value. If it
+        # does not depend on any bound variable at all, then its value can be
+        # shared with any other occurrence of the same subformula.
+        free = formula.free_variables()
+        if not bound or bound[-1] not in free:
+            levels = sorted(_level(v, bound) for v in set(bound) if v in free)
+            return _memoise(evaluate, formula, levels)
+
+    return evaluate
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_cached(formula, bound):
+    return _compile(formula, bound)
+
+
+def _compile_node(formula, bound):
     if isinstance(formula, Var):
-        return model.assignments[formula.value]
+        name = formula.value
+
+        if name in bound:
+            level = _level(name, bound)
+
+            def evaluate(model, memo, env):
+                return env[level]
+
+        else:
+
+            def evaluate(model, memo, env):
+                return model.assignments[name]
+
+    elif isinstance(formula, _CONNECTIVES) and _nests_deeply(formula):
+        evaluate = _compile_connectives(formula, bound)
+
     elif isinstance(formula, And):
-        return interpret_formula(formula.left, model) and interpret_formula(
-            formula.right, model
-        )
+        # A chain of conjunctions like a & b & c is evaluated in a loop rather
+        # than by nested calls, so that long chains do not approach the
+        # recursion limit. The same goes for the other connectives below, and
+        # deep nestings of different connectives are compiled by
+        # _compile_connectives.
+        operands = [_compile(operand, bound) for operand in _flatten_chain(formula)]
+
+        def evaluate(model, memo, env):
+            for operand in operands:
+                value = operand(model, memo, env)
+                if not value:
+                    break
+            return value
+
     elif isinstance(formula, Or):
-        return interpret_formula(formula.left, model) or interpret_formula(
-            formula.right, model
-        )
+        operands = [_compile(operand, bound) for operand in _flatten_chain(formula)]
+
+        def evaluate(model, memo, env):
+            for operand in operands:
+                value = operand(model, memo, env)
+                if value:
+                    break
+            return value
+
     elif isinstance(formula, IfThen):
-        return not interpret_formula(formula.left, model) or interpret_formula(
-            formula.right, model
-        )
+        antecedents, consequent = _flatten_implication(formula)
+        antecedents = [_compile(antecedent, bound) for antecedent in antecedents]
+        consequent = _compile(consequent, bound)
+
+        def evaluate(model, memo, env):
+            for antecedent in antecedents:
+                if not antecedent(model, memo, env):
+                    return True
+            return consequent(model, memo, env)
+
     elif isinstance(formula, Call):
-        caller = interpret_formula(formula.caller, model)
-        arg = interpret_formula(formula.arg, model)
-        return arg in caller
+        # F(x, y) is represented as F(x)(y), but it is evaluated as a single
+        # lookup of (x, y) if F denotes a Relation.
+        head, args = _flatten_call(formula)
+        caller = _compile(head, bound)
+        args = [_compile(arg, bound) for arg in args]
+
+        if len(args) == 1:
+            arg = args[0]
+
+            def evaluate(model, memo, env):
+                function = caller(model, memo, env)
+                if isinstance(function, Relation):
+                    return function.apply((arg(model, memo, env),))
+                return arg(model, memo, env) in function
+
+        else:
+
+            def evaluate(model, memo, env):
+                function = caller(model, memo, env)
+                if isinstance(function, Relation):
+                    return function.apply(tuple(arg(model, memo, env) for arg in args))
+                for arg in args:
+                    function = arg(model, memo, env) in function
+                return function
+
     elif isinstance(formula, ForAll):
-        return len(satisfiers(formula.body, model, formula.symbol)) == len(
-            model.individuals
-        )
+        symbol = formula.symbol
+        body = _compile(formula.body, bound + (symbol,))
+        plan = _plan(formula.body, symbol, bound)
+
+        def evaluate(model, memo, env):
+            planned = _run_plan(plan, model, memo, env)
+            if planned is not None:
+                algebra, extension = planned
+                return algebra.is_universe(extension)
+            # True unless there is at least one counterexample.
+            return not _take(_iter_satisfiers(body, model, memo, env, negate=True), 1)
+
     elif isinstance(formula, Exists):
-        return len(satisfiers(formula.body, model, formula.symbol)) > 0
+        symbol = formula.symbol
+        body = _compile(formula.body, bound + (symbol,))
+        plan = _plan(formula.body, symbol, bound)
+
+        def evaluate(model, memo, env):
+            planned = _run_plan(plan, model, memo, env)
+            if planned is not None:
+                algebra, extension = planned
+                return not algebra.is_empty(extension)
+            return bool(_take(_iter_satisfiers(body, model, memo, env), 1))
+
     elif isinstance(formula, Not):
-        return not interpret_formula(formula.operand, model)
-    elif isinstance(formula, Iota):
-        sset = satisfiers(formula.body, model, formula.symbol)
-        if len(sset) == 1:
-            return sset.pop()
+        negations, operand = _flatten_negation(formula)
+        operand = _compile(operand, bound)
+
+        if negations % 2 == 1:
+
+            def evaluate(model, memo, env):
+                return not operand(model, memo, env)
+
         else:
-            return None
+
+            def evaluate(model, memo, env):
+                return bool(operand(model, memo, env))
+
+    elif isinstance(formula, Iota):
+        symbol = formula.symbol
+        body = _compile(formula.body, bound + (symbol,))
+        plan = _plan(formula.body, symbol, bound)
+
+        def evaluate(model, memo, env):
+            planned = _run_plan(plan, model, memo, env)
+            if planned is not None:
+                algebra, extension = planned
+                sset = algebra.members(extension, 2)
+            else:
+                # Two satisfiers are enough to know that the description fails.
+                sset = _take(_iter_satisfiers(body, model, memo, env), 2)
+            if len(sset) == 1:
+                return sset[0]
+            else:
+                return None
+
     else:
         # TODO: Handle LambdaNodes differently (they can't be interpreted, but
         # they should give a better error message).
-        raise NotImplementedError(formula.__class__)
+        cls = formula.__class__
+
+        # The error is deferred until evaluation so that compiling a formula
+        # never fails where interpreting it directly would have succeeded.
+        def evaluate(model, memo, env):
+            raise NotImplementedError(cls)
+
+    return evaluate
+
+
+# Each chain of the same connective is compiled into one closure, so nesting
+# different connectives, as in [[a & b] | c] & d, nests closures. Formulas in
+# which such nesting is deep are compiled into a program for a small machine
+# instead, so that neither compiling nor evaluating them uses a Python frame for
+# each level of nesting. Since every connective short-circuits, the machine
+# needs only one register, `value`, which holds the value of the last operand
+# that was evaluated. The instructions are pairs of an opcode and an argument:
+#
+#     (_LEAF, evaluate)     -- set `value` to the value of a compiled operand
+#     (_AND, target)        -- jump to `target` if `value` is false
+#     (_OR, target)         -- jump to `target` if `value` is true
+#     (_IMPLIES, target)    -- set `value` to True and jump to `target` if
+#                              `value` is false
+#     (_NOT, None)          -- negate `value`
+#     (_BOOL, None)         -- convert `value` to a boolean
+_LEAF, _AND, _OR, _IMPLIES, _NOT, _BOOL = range(6)
+
+_CONNECTIVES = (And, Or, IfThen, Not)
+
+# The depth of nested chains of connectives beyond which the machine is used.
+# Closures are faster to evaluate when they are shallow.
+_MAX_CLOSURE_DEPTH = 50
+
+
+def _nests_deeply(formula):
+    """Return True if compiling the connectives in `formula` into closures would
+    nest more than _MAX_CLOSURE_DEPTH of them.
+    """
+    stack = [(formula, 1)]
+    while stack:
+        formula, depth = stack.pop()
+        if depth > _MAX_CLOSURE_DEPTH:
+            return True
+        for operand in _connective_operands(formula):
+            if isinstance(operand, _CONNECTIVES):
+                stack.append((operand, depth + 1))
+    return False
+
+
+def _connective_operands(formula):
+    if isinstance(formula, (And, Or)):
+        return _flatten_chain(formula)
+    elif isinstance(formula, IfThen):
+        antecedents, consequent = _flatten_implication(formula)
+        return antecedents + [consequent]
+    else:
+        return [_flatten_negation(formula)[1]]
+
+
+def _compile_connectives(formula, bound):
+    program = []
+    # The work stack holds formulas to compile, jumps to emit (the opcode and the
+    # list that collects the jump's position) and lists of jumps to point at the
+    # end of the code emitted so far.
+    stack = [formula]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            for position in item:
+                program[position] = (program[position][0], len(program))
+        elif isinstance(item, tuple):
+            opcode, jumps = item
+            jumps.append(len(program))
+            program.append((opcode, None))
+        elif isinstance(item, (And, Or)):
+            opcode = _AND if isinstance(item, And) else _OR
+            operands = _flatten_chain(item)
+            jumps = []
+            stack.append(jumps)
+            stack.append(operands[-1])
+            for operand in reversed(operands[:-1]):
+                stack.append((opcode, jumps))
+                stack.append(operand)
+        elif isinstance(item, IfThen):
+            antecedents, consequent = _flatten_implication(item)
+            jumps = []
+            stack.append(jumps)
+            stack.append(consequent)
+            for antecedent in reversed(antecedents):
+                stack.append((_IMPLIES, jumps))
+                stack.append(antecedent)
+        elif isinstance(item, Not):
+            negations, operand = _flatten_negation(item)
+            stack.append((_NOT if negations % 2 == 1 else _BOOL, []))
+            stack.append(operand)
+        else:
+            program.append((_LEAF, _compile(item, bound)))
+    program = tuple(program)
+    end = len(program)
+
+    def evaluate(model, memo, env):
+        value = None
+        pc = 0
+        while pc < end:
+            opcode, argument = program[pc]
+            pc += 1
+            if opcode == _LEAF:
+                value = argument(model, memo, env)
+            elif opcode == _AND:
+                if not value:
+                    pc = argument
+            elif opcode == _OR:
+                if value:
+                    pc = argument
+            elif opcode == _IMPLIES:
+                if not value:
+                    value = True
+                    pc = argument
+            elif opcode == _NOT:
+                value = not value
+            else:
+                value = bool(value)
+        return value
+
+    return evaluate
 
 
 def satisfiers(formula, model, variable):
-    individuals = set()
-    old_value = model.assignments.get(variable)
-    for individual in model.individuals:
-        model.assignments[variable] = individual
-        if interpret_formula(formula, model):
-            individuals.add(individual)
-
-    if old_value is None:
-        del model.assignments[variable]
+    """Return the set of individuals in the model that satisfy `formula` when
+    they are assigned to `variable`.
+    """
+    return set(iter_satisfiers(formula, model, variable))
+
+
+def iter_satisfiers(formula, model, variable):
+    """Like satisfiers, but yield the individuals one at a time, so that the
+    caller can stop as soon as it has seen enough of them.
+    """
+    evaluate = _compile_cached(formula, (variable,))
+    return _iter_satisfiers(evaluate, model, {}, ())
+
+
+def _iter_satisfiers(evaluate, model, memo, env, negate=False, domain=None):
+    # Yield the individuals that satisfy `evaluate`, a compiled quantifier body,
+    # when they are added to the environment `env`. If `negate` is True, yield
+    # the individuals that do NOT satisfy it instead. If `domain` is given, only
+    # the individuals in it are tried.
+    if domain is None:
+        domain = model.individuals
+    for individual in domain:
+        if bool(evaluate(model, memo, env + (individual,))) is not negate:
+            yield individual
+
+
+class Relation:
+    """The extension of an n-ary predicate, as a set of n-tuples.
+
+    Each argument position is indexed, so looking up the tuples with a given
+    value in some position does not require a scan of the whole relation. When
+    a Relation is called with fewer arguments than its arity, the result is the
+    relation restricted to tuples beginning with those arguments: a Relation of
+    lower arity, or a set of individuals if only one argument is missing.
+    """
+
+    def __init__(self, tuples, arity=None):
+        self.tuples = frozenset(tuple(t) for t in tuples)
+        if arity is None:
+            if not self.tuples:
+                raise ValueError('the arity of an empty Relation must be given')
+            arity = len(next(iter(self.tuples)))
+
+        self.arity = arity
+        self.indexes = [{} for _ in range(arity)]
+        for t in self.tuples:
+            if len(t) != arity:
+                raise ValueError('{!r} does not have {} elements'.format(t, arity))
+            for value, index in zip(t, self.indexes):
+                index.setdefault(value, []).append(t)
+
+    def __contains__(self, t):
+        return t in self.tuples
+
+    def __iter__(self):
+        return iter(self.tuples)
+
+    def __len__(self):
+        return len(self.tuples)
+
+    def __eq__(self, other):
+        return isinstance(other, Relation) and self.tuples == other.tuples
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.tuples)
+
+    def __repr__(self):
+        return 'Relation({!r})'.format(set(self.tuples))
+
+    def apply(self, args):
+        """Apply the relation to the tuple `args`, as if it were a curried
+        function.
+        """
+        if len(args) == self.arity:
+            return args in self.tuples
+        elif len(args) < self.arity:
+            bound = dict(enumerate(args))
+            if len(args) == self.arity - 1:
+                return self.project(self.arity - 1, bound)
+            else:
+                return Relation(
+                    (t[len(args) :] for t in self.lookup(bound)),
+                    self.arity - len(args),
+                )
+        else:
+            raise TypeError(
+                'relation of arity {} applied to {} arguments'.format(
+                    self.arity, len(args)
+                )
+            )
+
+    def lookup(self, bound):
+        """Return the tuples whose values agree with `bound`, a dictionary from
+        argument positions to values.
+        """
+        if not bound:
+            return self.tuples
+
+        # Start from the most selective index.
+        candidates = min(
+            (self.indexes[i].get(value, ()) for i, value in bound.items()), key=len
+        )
+        return [
+            t for t in candidates if all(t[i] == value for i, value in bound.items())
+        ]
+
+    def project(self, position, bound):
+        """Return the set of values in `position` of the tuples that agree with
+        `bound`.
+        """
+        return {t[position] for t in self.lookup(bound)}
+
+
+# The query planner. The body of a quantifier is often built out of predicates
+# applied to the bound variable and combined with the logical connectives, e.g.
+# Ax.Child(x) -> Good(x) or Ex.Likes(j, x). Rather than evaluating such bodies
+# once per individual, the planner computes their extensions (the sets of
+# individuals that satisfy them) directly from the extensions of the predicates
+# and the indexes of relations.
+# Subformulas that cannot be planned are evaluated per individual, but only for
+# the individuals that the rest of the body has not already ruled out.
+
+
+# The number of levels of nested connectives that the planner descends into.
+# Deeper subformulas are evaluated per individual, so that planning does not
+# approach the recursion limit.
+_MAX_PLAN_DEPTH = 100
+
+
+def _plan(formula, variable, bound, depth=0):
+    """Return a plan to compute the extension of `formula` with respect to
+    `variable`, or None if the formula cannot be planned. `bound` is as for
+    _compile, and does not include `variable`. `depth` is the number of
+    connectives that enclose the formula within the quantifier's body.
+
+    A plan is a function that takes a model, a memo, an environment (as for the
+    functions returned by _compile) and an algebra (see _SetAlgebra), and
+    returns the extension in the algebra's representation.
+    """
+    if variable not in formula.free_variables():
+        # The formula has the same value for every individual, so it only needs
+        # to be evaluated once.
+        evaluate = _compile(formula, bound)
+        return lambda model, memo, env, algebra: algebra.constant(
+            evaluate(model, memo, env)
+        )
+    elif isinstance(formula, Call):
+        return _plan_call(formula, variable, bound)
+    elif depth >= _MAX_PLAN_DEPTH:
+        return None
+    elif isinstance(formula, Not):
+        negations, operand = _flatten_negation(formula)
+        plan = _plan(operand, variable, bound, depth + 1)
+        return _complement_plan(plan) if negations % 2 == 1 else plan
+    elif isinstance(formula, And):
+        operands = _flatten_chain(formula)
+        return _plan_conjunction(
+            [(operand, False) for operand in operands], variable, bound, depth
+        )
+    elif isinstance(formula, Or):
+        # a | b | c is equivalent to ~[~a & ~b & ~c].
+        operands = _flatten_chain(formula)
+        return _complement_plan(
+            _plan_conjunction(
+                [(operand, True) for operand in operands], variable, bound, depth
+            )
+        )
+    elif isinstance(formula, IfThen):
+        # a -> b -> c is equivalent to ~[a & b & ~c].
+        antecedents, consequent = _flatten_implication(formula)
+        operands = [(antecedent, False) for antecedent in antecedents]
+        operands.append((consequent, True))
+        return _complement_plan(_plan_conjunction(operands, variable, bound, depth))
+    else:
+        return None
+
+
+def _plan_conjunction(operands, variable, bound, depth):
+    """Return a plan for the conjunction of `operands`, a list of pairs of a
+    formula and a flag that is True if the formula is to be negated.
+    """
+    plans = []
+    constants = []
+    unplanned = []
+    for operand, negate in operands:
+        if variable not in operand.free_variables():
+            # The operand has the same value for every individual. It is only
+            # evaluated once the rest of the conjunction is known to be
+            # satisfiable, so that, as with per-individual evaluation, it is
+            # never reached when the restrictor is empty.
+            constants.append((_compile(operand, bound), negate))
+            continue
+        plan = _plan(operand, variable, bound, depth + 1)
+        if plan is not None:
+            plans.append(_complement_plan(plan) if negate else plan)
+        else:
+            unplanned.append((_compile(operand, bound + (variable,)), negate))
+
+    if not plans:
+        return None
+
+    def plan(model, memo, env, algebra):
+        extension = plans[0](model, memo, env, algebra)
+        for other in plans[1:]:
+            extension = algebra.intersect(extension, other(model, memo, env, algebra))
+        for evaluate, negate in constants:
+            if algebra.is_empty(extension):
+                return extension
+            if bool(evaluate(model, memo, env)) == negate:
+                return algebra.constant(False)
+        # Only evaluate the operands that could not be planned for the
+        # individuals that satisfy the ones that could.
+        for evaluate, negate in unplanned:
+            extension = algebra.restrict(extension, evaluate, model, memo, env, negate)
+        return extension
+
+    return plan
+
+
+def _plan_call(formula, variable, bound):
+    """Return a plan for a predicate applied to arguments of which exactly one is
+    `variable` itself and the rest do not mention it, e.g. Likes(j, x).
+    """
+    head, args = _flatten_call(formula)
+    if not isinstance(head, Var) or head.value == variable:
+        return None
+
+    positions = [i for i, arg in enumerate(args) if variable in arg.free_variables()]
+    if len(positions) != 1 or args[positions[0]] != Var(variable):
+        return None
+
+    caller = _compile(head, bound)
+    arity = len(args)
+    position = positions[0]
+    others = [(i, _compile(arg, bound)) for i, arg in enumerate(args) if i != position]
+
+    def plan(model, memo, env, algebra):
+        try:
+            function = caller(model, memo, env)
+        except KeyError:
+            raise _NoPlan
+        if isinstance(function, Relation) and function.arity == arity:
+            known = {i: evaluate(model, memo, env) for i, evaluate in others}
+            return algebra.extension(function.project(position, known))
+        elif arity == 1:
+            return algebra.extension(function)
+        else:
+            raise _NoPlan
+
+    return plan
+
+
+def _complement_plan(plan):
+    if plan is None:
+        return None
+    return lambda model, memo, env, algebra: algebra.complement(
+        plan(model, memo, env, algebra)
+    )
+
+
+def _run_plan(plan, model, memo, env):
+    """Execute `plan` against `model` and return a pair (algebra, extension), or
+    None if the plan cannot be used for this model, in which case the caller
+    should fall back to evaluating the formula once per individual.
+    """
+    if plan is None:
+        return None
+
+    algebra = _algebra_for(model)
+    if algebra is None:
+        return None
+
+    try:
+        return algebra, plan(model, memo, env, algebra)
+    except _NoPlan:
+        return None
+
+
+def _algebra_for(model):
+    individuals = model.individuals
+    if not individuals:
+        # Nothing to be gained by planning.
+        return None
+    elif isinstance(model, ArrayWorldModel):
+        _import_numpy()
+        return _ArrayAlgebra(individuals, model.index)
+    elif isinstance(individuals, (set, frozenset)):
+        return _SetAlgebra(individuals)
     else:
-        model.assignments[variable] = old_value
+        return None
+
+
+class _NoPlan(Exception):
+    """Raised while executing a plan when the model turns out not to support it,
+    e.g. because a predicate's extension is not a set.
+    """
+
+
+class _SetAlgebra:
+    """Extensions as Python sets.
+
+    An extension is represented as a pair (members, complemented). If
+    `complemented` is False, the extension is `members`; if it is True, the
+    extension is every individual except `members`. Representing complements
+    implicitly means that negation never has to enumerate the whole domain.
+    `members` is always a subset of the domain.
+    """
+
+    def __init__(self, individuals):
+        self.individuals = individuals
+
+    def extension(self, value):
+        if not isinstance(value, (set, frozenset)):
+            raise _NoPlan
+        # Set intersection iterates over the smaller of the two sets.
+        return value & self.individuals, False
+
+    def constant(self, value):
+        return frozenset(), bool(value)
+
+    def complement(self, extension):
+        members, complemented = extension
+        return members, not complemented
+
+    def intersect(self, extension1, extension2):
+        members1, complemented1 = extension1
+        members2, complemented2 = extension2
+        if complemented1 and complemented2:
+            return members1 | members2, True
+        elif complemented1:
+            return members2 - members1, False
+        elif complemented2:
+            return members1 - members2, False
+        else:
+            return members1 & members2, False
+
+    def restrict(self, extension, evaluate, model, memo, env, negate):
+        domain = self._iter(extension)
+        satisfiers = _iter_satisfiers(evaluate, model, memo, env, negate, domain)
+        return set(satisfiers), False
+
+    def is_universe(self, extension):
+        members, complemented = extension
+        if complemented:
+            return not members
+        else:
+            return len(members) == len(self.individuals)
+
+    def is_empty(self, extension):
+        members, complemented = extension
+        if complemented:
+            return len(members) == len(self.individuals)
+        else:
+            return not members
+
+    def members(self, extension, n):
+        return _take(self._iter(extension), n)
+
+    def _iter(self, extension):
+        members, complemented = extension
+        if complemented:
+            return (x for x in self.individuals if x not in members)
+        else:
+            return iter(members)
+
+
+class _ArrayAlgebra:
+    """Extensions as boolean NumPy arrays indexed like the individuals of an
+    ArrayWorldModel. Constant extensions are represented by NumPy scalars,
+    which broadcast against arrays.
+    """
+
+    def __init__(self, individuals, index):
+        self.individuals = individuals
+        self.index = index
+
+    def extension(self, value):
+        if isinstance(value, PredicateArray) and value.index is self.index:
+            return value.array
+        elif isinstance(value, (set, frozenset)):
+            array = numpy.zeros(len(self.individuals), dtype=bool)
+            array[[self.index[x] for x in value if x in self.index]] = True
+            return array
+        else:
+            raise _NoPlan
+
+    def constant(self, value):
+        return numpy.bool_(value)
+
+    def complement(self, extension):
+        return ~extension
+
+    def intersect(self, extension1, extension2):
+        return extension1 & extension2
+
+    def restrict(self, extension, evaluate, model, memo, env, negate):
+        domain = self._iter(extension)
+        result = numpy.zeros(len(self.individuals), dtype=bool)
+        satisfiers = _iter_satisfiers(evaluate, model, memo, env, negate, domain)
+        for individual in satisfiers:
+            result[self.index[individual]] = True
+        return result
+
+    def is_universe(self, extension):
+        return bool(numpy.all(extension))
+
+    def is_empty(self, extension):
+        return not numpy.any(extension)
+
+    def members(self, extension, n):
+        return _take(self._iter(extension), n)
+
+    def _iter(self, extension):
+        if numpy.ndim(extension) == 0:
+            return iter(self.individuals if extension else ())
+        else:
+            return (self.individuals[i] for i in numpy.flatnonzero(extension))
+
+
+def _memoise(evaluate, formula, levels):
+    """Wrap `evaluate`, the compiled version of `formula`, so that its value is
+    remembered in the memo, keyed on the values of the variables at `levels` in
+    the environment.
+
+    The memo is a dictionary that lives for the duration of a single call of a
+    function returned by compile_formula (or of interpret_many), so a memoised
+    subformula is evaluated at most once for each assignment of its variables
+    during that call. For example, in Ax.Ay.Ez.R(x, z), the subformula
+    Ez.R(x, z) is evaluated once for each x rather than once for each pair of x
+    and y.
+    """
+    if not levels:
+        # The value of a subformula without bound variables does not depend on
+        # where it occurs, so it is keyed on the subformula itself.
+        def memoised(model, memo, env):
+            try:
+                return memo[formula]
+            except KeyError:
+                value = memo[formula] = evaluate(model, memo, env)
+                return value
+
+    else:
+
+        def memoised(model, memo, env):
+            key = (evaluate,) + tuple(env[level] for level in levels)
+            try:
+                return memo[key]
+            except KeyError:
+                value = memo[key] = evaluate(model, memo, env)
+                return value
+
+    return memoised
+
+
+def _level(variable, bound):
+    """Return the position of the innermost binding of `variable` in `bound`."""
+    return len(bound) - 1 - bound[::-1].index(variable)
+
+
+def _flatten_call(formula):
+    """Given a chain of calls F(x)(y)(z), return F and the list [x, y, z]."""
+    args = []
+    while isinstance(formula, Call):
+        args.append(formula.arg)
+        formula = formula.caller
+    args.reverse()
+    return formula, args
+
+
+def _flatten_chain(formula):
+    """Given a formula like a & [b & c] & d, return the list [a, b, c, d] of the
+    operands of the chain of connectives of the same class as `formula`.
+    """
+    cls = formula.__class__
+    operands = []
+    stack = [formula]
+    while stack:
+        formula = stack.pop()
+        if formula.__class__ is cls:
+            stack.append(formula.right)
+            stack.append(formula.left)
+        else:
+            operands.append(formula)
+    return operands
+
+
+def _flatten_implication(formula):
+    """Given a chain of implications a -> b -> c, return the list of
+    antecedents [a, b] and the consequent c.
+    """
+    antecedents = []
+    while isinstance(formula, IfThen):
+        antecedents.append(formula.left)
+        formula = formula.right
+    return antecedents, formula
+
+
+def _flatten_negation(formula):
+    """Given a chain of negations ~~~a, return the number of negations and a."""
+    negations = 0
+    while isinstance(formula, Not):
+        negations += 1
+        formula = formula.operand
+    return negations, formula
+
 
-    return individuals
+def _take(iterator, n):
+    """Return a list of at most the first `n` items of `iterator`."""
+    return list(itertools.islice(iterator, n))
@@ -3,34 +3,85 @@
 Author:  Ian Fisher (iafisher@protonmail.com)
 Version: November 2018
 """
+import argparse
+import fileinput
 import json
 import os
-import readline
 import sys
+import time
+from collections import OrderedDict
 
-from .translator import load_lexicon, translate_sentence
+from . import __version__
+from .exceptions import LexiconError
+from .reduction import NORMALIZERS
+from .translator import (
+    TranslationCache,
+    load_lexicon_file,
+    translate_sentence,
+    translate_stream,
+)
 
 
 class ShellState:
     """A box holding all the information the shell needs to run."""
 
-    def __init__(self, mode='translate', lexicon=None):
+    def __init__(self, mode='translate', lexicon=None, cache=None):
         self.mode = mode
         self.lexicon = lexicon
-
-
-def main():
-    print('The Montague natural language system (v0.1.4).\n')
+        self.cache = cache
+
+
+def main(argv=None):
+    args = build_argument_parser().parse_args(argv)
+    if args.command == 'batch':
+        run_batch(args)
+    else:
+        run_shell()
+
+
+def build_argument_parser():
+    parser = argparse.ArgumentParser(
+        prog='montague',
+        description='The Montague natural language system. Run without a command '
+        + 'to start the interactive shell.',
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    batch_parser = subparsers.add_parser(
+        'batch',
+        help='translate sentences in bulk',
+        description='Translate sentences, one per line, into JSON records, one per '
+        + 'line, of the form {"text": ..., "formula": ..., "type": ..., "error": ...}, '
+        + 'where "formula" and "type" are null if the sentence could not be '
+        + 'translated and "error" is null if it could. Blank lines are skipped.',
+    )
+    batch_parser.add_argument(
+        'files', nargs='*', help='files to read (default: standard input)'
+    )
+    batch_parser.add_argument(
+        '-o', '--output', help='file to write to (default: standard output)'
+    )
+    batch_parser.add_argument(
+        '--lexicon', default=FRAGMENT_PATH, help='JSON lexicon (default: %(default)s)'
+    )
+    batch_parser.add_argument(
+        '--simplify',
+        choices=sorted(NORMALIZERS),
+        default='reduce',
+        help='simplification method (default: %(default)s)',
+    )
+    return parser
+
+
+def run_shell():
+    # Imported for its side effect of adding line editing to input(), which only
+    # the interactive shell needs.
+    import readline
+
+    print('The Montague natural language system (v{}).\n'.format(__version__))
     print(HELP_MESSAGE)
 
-    try:
-        with open(FRAGMENT_PATH) as f:
-            lexicon = load_lexicon(json.load(f))
-    except (FileNotFoundError, IOError):
-        sys.stderr.write('Error: failed to open {}\n'.format(FRAGMENT_PATH))
-        sys.exit(1)
-
-    shell_state = ShellState(lexicon=lexicon)
+    lexicon = load_lexicon_or_exit(FRAGMENT_PATH)
+    shell_state = ShellState(lexicon=lexicon, cache=TranslationCache())
     while True:
         try:
             command = input('>>> ')
@@ -43,6 +94,77 @@ def main():
             print(response)
 
 
+def run_batch(args):
+    """Translate the sentences in the files named by the command-line arguments
+    (see build_argument_parser) and write a JSON record for each one.
+
+    Records are written as soon as each sentence is translated, and the number
+    of sentences translated per second is reported on standard error at the
+    end.
+    """
+    lexicon = load_lexicon_or_exit(args.lexicon)
+    lines = fileinput.input(args.files or ['-'])
+    output = sys.stdout
+    count = failures = 0
+    start = time.perf_counter()
+    try:
+        if args.output is not None:
+            output = open(args.output, 'w')
+        results = translate_stream(lines, lexicon, args.simplify, TranslationCache())
+        for result in results:
+            output.write(json.dumps(translation_record(result)) + '\n')
+            output.flush()
+            count += 1
+            if result.error is not None:
+                failures += 1
+    except OSError as e:
+        # The input files are only opened as they are reached, so an input file
+        # that cannot be opened is reported after the records that precede it.
+        if e.filename is None:
+            raise
+        sys.stderr.write('Error: failed to open {}\n'.format(e.filename))
+        sys.exit(1)
+    finally:
+        lines.close()
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    sys.stderr.write(
+        'Translated {} sentences ({} failed) in {:.2f}s ({:.0f} sentences/s).\n'.format(
+            count, failures, elapsed, count / elapsed if elapsed > 0 else 0
+        )
+    )
+
+
+def translation_record(result):
+    """Convert a TranslationResult into a dictionary to be written as JSON, with
+    the keys 'text', 'formula', 'type' and 'error', in that order.
+    """
+    translation = result.translation
+    return OrderedDict(
+        [
+            ('text', result.text),
+            ('formula', None if translation is None else str(translation.formula)),
+            ('type', None if translation is None else str(translation.type)),
+            ('error', None if result.error is None else str(result.error)),
+        ]
+    )
+
+
+def load_lexicon_or_exit(path):
+    """Load the lexicon at `path`, or exit with an error message if it cannot be
+    loaded.
+    """
+    try:
+        return load_lexicon_file(path, cache_dir=CACHE_DIR)
+    except (FileNotFoundError, IOError):
+        sys.stderr.write('Error: failed to open {}\n'.format(path))
+    except (LexiconError, ValueError) as e:
+        sys.stderr.write('Error: invalid lexicon {} ({})\n'.format(path, e))
+    sys.exit(1)
+
+
 def execute_command(command, shell_state):
     command = command.strip()
     if command.startswith('!'):
@@ -69,7 +191,9 @@ def execute_command(command, shell_state):
             return 'Unrecognized command {}.'.format(command)
     elif command:
         try:
-            entry = translate_sentence(command, shell_state.lexicon)
+            entry = translate_sentence(
+                command, shell_state.lexicon, cache=shell_state.cache
+            )
         # TODO: Only catch montague errors
         except Exception as e:
             return 'Error: {}'.format(e)
@@ -97,3 +221,7 @@ AVAILABLE_MODES_STR = ', '.join(AVAILABLE_MODES)
 
 PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
 FRAGMENT_PATH = os.path.join(PROJECT_DIR, 'montague', 'resources', 'fragment.json')
+# The directory where the compiled lexicon is stored (see load_lexicon_file).
+CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'montague'
+)
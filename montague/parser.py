@@ -1,161 +1,238 @@
 """The parser for Montague's logical representation language, including type
 expressions.
 
+Formulas and types are parsed by the hand-written parsers parse_formula and
+parse_type. The reference definition of the syntax, against which they are
+tested, is the Lark grammars in test/lark_reference.py.
+
 Author:  Ian Fisher (iafisher@protonmail.com)
 Version: September 2018
 """
+import functools
+import re
 from collections import namedtuple
 
-from lark import Lark, Transformer
-from lark.exceptions import LarkError
-
 from .ast import *
 from .exceptions import ParseError
 
 
-class TreeToFormula(Transformer):
-    """Transform Lark's parse tree into a formula tree with Formula objects."""
-
-    def expr(self, matches):
-        if matches[1] == '->':
-            return IfThen(matches[0], matches[2])
-        elif matches[1] == '<->':
-            return IfAndOnlyIf(matches[0], matches[2])
-        else:
-            raise NotImplementedError
-
-    def ifterm(self, matches):
-        return Or(matches[0], matches[2])
-
-    def term(self, matches):
-        return And(matches[0], matches[2])
-
-    def variable(self, matches):
-        return Var(matches[0])
-
-    def lambda_(self, matches):
-        return Lambda(matches[1], matches[2])
-
-    def forall(self, matches):
-        return ForAll(matches[1], matches[2])
-
-    def exists(self, matches):
-        return Exists(matches[1], matches[2])
-
-    def call(self, matches):
-        # The parse tree allows n-ary functions but the AST only allows unary
-        # functions. This methods converts the former to the latter, e.g.
-        # F(x, y, z) becomes F(x)(y)(z), three nested CallNodes.
-        func = Call(matches[0], matches[1])
-        for i in range(2, len(matches)):
-            func = Call(func, matches[i])
-        return func
-
-    def iota(self, matches):
-        return Iota(matches[1], matches[2])
-
-    def not_e(self, matches):
-        return Not(matches[1])
-
-
-# The grammar of the logical language.
-formula_parser = Lark(
-    '''
-    ?start: expr
-
-    ?expr: ifterm | ifterm IMPLIES expr | ifterm IFF expr
-
-    ?ifterm: term | term OR ifterm
-    ?term: factor | factor AND term
-    ?factor: variable
-           | "[" expr "]"
-           | call
-           | lambda_
-           | forall
-           | exists
-           | iota
-           | NOT factor  -> not_e
-
-    call: variable "(" _arglist ")" | "(" expr ")" "(" _arglist ")"
-    _arglist: ( expr "," )* expr
-
-    lambda_: LAMBDA SYMBOL "." expr
-    forall: FORALL SYMBOL "." expr
-    exists: EXISTS SYMBOL "." expr
-    iota: IOTA SYMBOL "." expr
-
-    variable: SYMBOL
-
-    SYMBOL: /[B-DF-KM-Za-hj-z][A-Za-z0-9_'-]*/
-    OR: "|"
-    AND: "&"
-    IMPLIES: "->"
-    IFF: "<->"
-    NOT: "~"
-
-    LAMBDA: "L" | "λ"
-    FORALL: "A" | "∀"
-    EXISTS: "E" | "∃"
-    IOTA: "i" | "ι"
-
-    %import common.WS
-    %ignore WS
-''',
-    parser='lalr',
-    transformer=TreeToFormula(),
-)
+# The number of strings whose parses are remembered by parse_formula and by
+# parse_type. Lexicons repeat the same denotations and types many times over.
+PARSE_CACHE_SIZE = 8192
 
 
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
 def parse_formula(formula):
     """Parse `formula`, a string, into a tree of Formula objects.
 
-    If the string cannot be parsed, a montague.exceptions.ParseError is raised.
-    """
-    try:
-        return formula_parser.parse(formula)
-    except LarkError as e:
-        raise ParseError(str(e)) from None
-
+    The results for recently parsed strings are cached, which is safe since
+    formulas are immutable. parse_formula.cache_info() returns the statistics of
+    the cache and parse_formula.cache_clear() empties it.
 
-class TreeToType(Transformer):
-    """Transform Lark's parse tree into a type tree with ComplexType and
-    AtomicType objects.
+    If the string cannot be parsed, a montague.exceptions.ParseError is raised.
     """
-
-    def type(self, matches):
-        if len(matches) == 2:
-            return ComplexType(matches[0], matches[1])
-        elif len(matches) == 1:
-            if len(matches[0]) == 2:
-                return ComplexType(AtomicType(matches[0][0]), AtomicType(matches[0][1]))
+    # The formula is parsed by operator precedence, with explicit stacks rather
+    # than recursion so that arbitrarily deep formulas can be parsed. `operands`
+    # holds the formulas that have been parsed, and `operators` holds the
+    # operators that are still waiting for their operands, as well as markers
+    # for open brackets and argument lists (see _reduce).
+    tokens = _tokenize(formula, _FORMULA_TOKEN)
+    operands = []
+    operators = []
+    expect_operand = True
+    i = 0
+    while True:
+        kind, text, _ = tokens[i]
+        i += 1
+        if expect_operand:
+            if kind == 'symbol':
+                if tokens[i][0] == '(':
+                    # The marker of an argument list holds the function followed
+                    # by the arguments that have been parsed so far.
+                    operators.append((-1, _ARGUMENTS, [Var(text)]))
+                    i += 1
+                else:
+                    operands.append(Var(text))
+                    expect_operand = False
+            elif kind == 'binder':
+                if tokens[i][0] != 'symbol':
+                    raise _unexpected(tokens[i])
+                if tokens[i + 1][0] != '.':
+                    raise _unexpected(tokens[i + 1])
+                operators.append((0, _BINDER, (_BINDERS[text], tokens[i][1])))
+                i += 2
+            elif kind == '~':
+                operators.append((4, _NOT, None))
+            elif kind == '[':
+                operators.append((-1, _BRACKETS, None))
+            elif kind == '(':
+                operators.append((-1, _PARENTHESES, None))
             else:
-                return AtomicType(matches[0])
+                raise _unexpected(tokens[i - 1])
+        elif kind in _INFIX:
+            precedence, cls = _INFIX[kind]
+            _reduce(operands, operators, precedence)
+            operators.append((precedence, _INFIX_OPERATOR, cls))
+            expect_operand = True
         else:
-            raise NotImplementedError
-
+            _reduce(operands, operators, -1)
+            marker = operators[-1][1] if operators else None
+            if kind == 'end' and marker is None:
+                return operands.pop()
+            elif kind == ']' and marker == _BRACKETS:
+                operators.pop()
+            elif kind == ',' and marker == _ARGUMENTS:
+                operators[-1][2].append(operands.pop())
+                expect_operand = True
+            elif kind == ')' and marker == _ARGUMENTS:
+                function = operators.pop()[2]
+                function.append(operands.pop())
+                call = function[0]
+                for argument in function[1:]:
+                    call = Call(call, argument)
+                operands.append(call)
+            elif kind == ')' and marker == _PARENTHESES and tokens[i][0] == '(':
+                # A parenthesized formula must be the function of a call.
+                operators[-1] = (-1, _ARGUMENTS, [operands.pop()])
+                expect_operand = True
+                i += 1
+            else:
+                raise _unexpected(tokens[i - 1])
 
-# The grammar of the type mini-language.
-type_parser = Lark(
-    '''
-    ?start: type
 
-    type: "<" type "," type ">"
-        | /[evst]{1,2}/
+def _reduce(operands, operators, precedence):
+    """Apply the operators on top of the stack whose precedence is greater than
+    `precedence` to their operands.
 
-    %import common.WS
-    %ignore WS
-''',
-    parser='lalr',
-    transformer=TreeToType(),
+    Each entry of the operator stack is a tuple (precedence, kind, data). Binders
+    have the lowest precedence of any operator, so that their bodies extend as
+    far to the right as possible, and markers have a precedence of -1, so that
+    they are never removed by this function.
+    """
+    while operators and operators[-1][0] > precedence:
+        _, kind, data = operators.pop()
+        if kind == _NOT:
+            operands[-1] = Not(operands[-1])
+        elif kind == _BINDER:
+            cls, symbol = data
+            operands[-1] = cls(symbol, operands[-1])
+        else:
+            right = operands.pop()
+            operands[-1] = data(operands[-1], right)
+
+
+# The kinds of entries on the operator stack of parse_formula.
+_NOT, _INFIX_OPERATOR, _BINDER, _BRACKETS, _PARENTHESES, _ARGUMENTS = range(6)
+
+# The precedence of each binary operator and the class of formula that it
+# builds. All binary operators are right-associative.
+_INFIX = {'->': (1, IfThen), '<->': (1, IfAndOnlyIf), '|': (2, Or), '&': (3, And)}
+
+_BINDERS = {
+    'L': Lambda,
+    'λ': Lambda,
+    'A': ForAll,
+    '∀': ForAll,
+    'E': Exists,
+    '∃': Exists,
+    'i': Iota,
+    'ι': Iota,
+}
+
+# The tokens of the logical language, as in the Lark grammar. Since no two kinds
+# of tokens can start with the same character, the formula can be tokenized
+# before it is parsed.
+_FORMULA_TOKEN = re.compile(
+    r"[ \t\f\r\n]*(?:"
+    r"(?P<symbol>[B-DF-KM-Za-hj-z][A-Za-z0-9_'-]*)"
+    r"|(?P<punctuation><->|->|[|&~\[\](),.])"
+    r"|(?P<binder>[LAEiλ∀∃ι])"
+    r")"
 )
 
 
+@functools.lru_cache(maxsize=PARSE_CACHE_SIZE)
 def parse_type(typestring):
     """Parse `typestring` into a tree of ComplexType and AtomicType objects.
 
+    The results are cached like those of parse_formula.
+
     If the string cannot be parsed, a montague.exceptions.ParseError is raised.
     """
-    try:
-        return type_parser.parse(typestring)
-    except LarkError as e:
-        raise ParseError(str(e)) from None
+    tokens = _tokenize(typestring, _TYPE_TOKEN)
+    # `pending` holds the left half of each complex type whose closing '>' has not
+    # been reached yet, or None if its left half has not been parsed yet.
+    pending = []
+    i = 0
+    while True:
+        kind, text, _ = tokens[i]
+        i += 1
+        if kind == '<':
+            pending.append(None)
+            continue
+        elif kind != 'atom':
+            raise _unexpected(tokens[i - 1])
+
+        if len(text) == 2:
+            type_ = ComplexType(AtomicType(text[0]), AtomicType(text[1]))
+        else:
+            type_ = AtomicType(text)
+        while pending and pending[-1] is not None:
+            if tokens[i][0] != '>':
+                raise _unexpected(tokens[i])
+            type_ = ComplexType(pending.pop(), type_)
+            i += 1
+
+        expected = ',' if pending else 'end'
+        if tokens[i][0] != expected:
+            raise _unexpected(tokens[i])
+        elif not pending:
+            return type_
+        pending[-1] = type_
+        i += 1
+
+
+_TYPE_TOKEN = re.compile(
+    r'[ \t\f\r\n]*(?:(?P<atom>[evst]{1,2})|(?P<punctuation>[<,>]))'
+)
+
+
+def _tokenize(text, pattern):
+    """Split `text` into a list of tokens by the regular expression `pattern`.
+
+    Each token is a tuple (kind, text, position), where `kind` is the name of the
+    group of `pattern` that matched, or the text itself for punctuation. The
+    list ends with an 'end' token. If `text` contains a character that cannot
+    start a token, a ParseError is raised.
+    """
+    tokens = []
+    position = 0
+    while True:
+        match = pattern.match(text, position)
+        if match is None:
+            break
+        kind = match.lastgroup
+        value = match.group(kind)
+        tokens.append(
+            (value if kind == 'punctuation' else kind, value, match.start(kind))
+        )
+        position = match.end()
+
+    position = _WHITESPACE.match(text, position).end()
+    if position < len(text):
+        raise ParseError(
+            'Unexpected character {!r} at position {}'.format(text[position], position)
+        )
+    tokens.append(('end', '', position))
+    return tokens
+
+
+_WHITESPACE = re.compile(r'[ \t\f\r\n]*')
+
+
+def _unexpected(token):
+    kind, text, position = token
+    if kind == 'end':
+        return ParseError('Unexpected end of input')
+    else:
+        return ParseError('Unexpected {!r} at position {}'.format(text, position))
@@ -0,0 +1,484 @@
+"""A nameless representation of logical formulas, used to simplify them.
+
+In the core representation, variables bound by a lambda or a quantifier are
+replaced by de Bruijn indices, i.e. the number of binders between the variable
+and the binder that it refers to. Beta reduction on core terms never has to
+rename variables or compare names, and it cannot capture variables.
+
+Core terms are tuples. The first two elements are always a tag and the number of
+enclosing binders that the term refers to (0 if the term has no dangling
+indices):
+
+    (FREE, 0, name)
+    (BOUND, index + 1, index)
+    (BINDER, loose, cls, name, body)
+    (NODE, loose, cls, child1, child2, ...)
+
+BINDER terms represent Lambda, ForAll, Exists and Iota formulas. Their `name` is
+the name of the variable in the original formula, which is kept only so that it
+can be reused when the term is converted back into a formula.
+
+Core terms can be normalized in two ways: by repeated beta reduction
+(`normalize`), or by evaluating them into closures and reading the normal form
+back from the result (`normalize_by_evaluation`).
+
+All the functions in this module traverse terms with an explicit stack rather
+than by recursion, so that arbitrarily deep formulas can be simplified. Since
+not every term has a normal form, the normalizers give up with a
+NormalizationError after a number of beta steps proportional to the size of the
+term.
+"""
+from .ast import Call, Exists, ForAll, Iota, Lambda, Var
+from .exceptions import NormalizationError
+
+
+FREE, BOUND, BINDER, NODE = range(4)
+
+BINDERS = (Lambda, ForAll, Exists, Iota)
+
+# The default number of beta steps that the normalizers take for each node of the
+# term before they give up.
+STEPS_PER_NODE = 1000
+
+
+def simplify_formula(formula, method='reduce'):
+    """Simplify the formula by beta reduction, without capturing variables.
+
+    `method` is either 'reduce' to use `normalize` or 'nbe' to use
+    `normalize_by_evaluation`. Both methods give the same result.
+
+    If the formula has no normal form, a NormalizationError is raised.
+
+    The names of bound variables are preserved, except that a name is primed
+    (x becomes x', x'' and so on) when keeping it would capture a variable.
+    """
+    try:
+        normalizer = NORMALIZERS[method]
+    except KeyError:
+        raise ValueError('unknown simplification method {!r}'.format(method))
+    return from_core(normalizer(to_core(formula)))
+
+
+def alpha_equivalent(formula1, formula2):
+    """Return True if the two formulas are the same except for the names of
+    their bound variables.
+    """
+    pairs = [(to_core(formula1), to_core(formula2))]
+    while pairs:
+        term1, term2 = pairs.pop()
+        if term1 is term2:
+            continue
+        if term1[:3] != term2[:3]:
+            # The tags, loose counts, and names or indices or classes differ.
+            return False
+
+        if term1[0] == BINDER:
+            pairs.append((term1[4], term2[4]))
+        elif term1[0] == NODE:
+            if len(term1) != len(term2):
+                return False
+            pairs.extend(zip(term1[3:], term2[3:]))
+    return True
+
+
+# A traversal pushes a frame starting with _BUILD onto its stack before it
+# pushes the children of a term, and pops the frame once the results for all of
+# the children are on its stack of results, at which point it combines them
+# into the result for the term itself.
+_BUILD = object()
+
+
+def to_core(formula):
+    """Convert a Formula object into a core term."""
+    # `scope` holds the variables bound by the binders that enclose the
+    # subformula being converted, innermost last.
+    scope = []
+    terms = []
+    stack = [formula]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, tuple):
+            formula = item[1]
+            if isinstance(formula, BINDERS):
+                scope.pop()
+                name, _ = formula
+                term = _binder(formula.__class__, name, terms.pop())
+            else:
+                n = len(formula._fields)
+                term = _node(formula.__class__, terms[-n:])
+                del terms[-n:]
+            terms.append(term)
+            continue
+
+        formula = item
+        if isinstance(formula, Var):
+            name = formula.value
+            for i in range(len(scope) - 1, -1, -1):
+                if scope[i] == name:
+                    terms.append(_bound(len(scope) - 1 - i))
+                    break
+            else:
+                terms.append((FREE, 0, name))
+        elif isinstance(formula, BINDERS):
+            name, body = formula
+            scope.append(name)
+            stack.append((_BUILD, formula))
+            stack.append(body)
+        else:
+            stack.append((_BUILD, formula))
+            stack.extend(reversed(list(formula)))
+    return terms[0]
+
+
+def from_core(term):
+    """Convert a core term with no dangling indices into a Formula object."""
+    # `names` holds the variables of the enclosing binders, innermost last. A
+    # term with no dangling indices converts to the same formula wherever it
+    # occurs, so the result is shared through `memo`. The term is stored
+    # alongside the formula so that its id is not reused.
+    free = _free_names(term)
+    names = []
+    memo = {}
+    formulas = []
+    stack = [term]
+    while stack:
+        item = stack.pop()
+        if item[0] is _BUILD:
+            term = item[1]
+            if term[0] == BINDER:
+                names.pop()
+                formula = term[2](item[2], formulas.pop())
+            else:
+                n = len(term) - 3
+                formula = term[2](*formulas[-n:])
+                del formulas[-n:]
+            if term[1] == 0:
+                memo[id(term)] = (term, formula)
+            formulas.append(formula)
+            continue
+
+        term = item
+        tag = term[0]
+        if tag == FREE:
+            formulas.append(Var(term[2]))
+        elif tag == BOUND:
+            formulas.append(Var(names[-1 - term[2]]))
+        elif term[1] == 0 and id(term) in memo:
+            formulas.append(memo[id(term)][1])
+        elif tag == BINDER:
+            name, body = term[3:]
+            while not _can_bind(name, body, names, free):
+                name += "'"
+            names.append(name)
+            stack.append((_BUILD, term, name))
+            stack.append(body)
+        else:
+            stack.append((_BUILD, term))
+            stack.extend(reversed(term[3:]))
+    return formulas[0]
+
+
+def _can_bind(name, body, names, free):
+    """Return True if a binder whose body is `body` can use `name` for its
+    variable without capturing a free name in the body or shadowing one of the
+    enclosing binders' variables, `names`, that the body refers to.
+
+    `free` is the set of all free names in the whole term.
+    """
+    if name not in free and name not in names:
+        return True
+
+    # `depth` is the number of binders between the subterm and `body`.
+    stack = [(body, 0)]
+    while stack:
+        term, depth = stack.pop()
+        tag = term[0]
+        if tag == FREE:
+            if term[2] == name:
+                return False
+        elif tag == BOUND:
+            index = term[2]
+            if index > depth and names[depth - index] == name:
+                return False
+        elif tag == BINDER:
+            stack.append((term[4], depth + 1))
+        else:
+            stack.extend((c, depth) for c in term[3:])
+    return True
+
+
+def _free_names(term):
+    """Return the set of free names in the core term."""
+    names = set()
+    seen = set()
+    stack = [term]
+    while stack:
+        term = stack.pop()
+        tag = term[0]
+        if tag == FREE:
+            names.add(term[2])
+        elif tag != BOUND and id(term) not in seen:
+            seen.add(id(term))
+            if tag == BINDER:
+                stack.append(term[4])
+            else:
+                stack.extend(term[3:])
+    return names
+
+
+def normalize(term, max_steps=None):
+    """Return the beta normal form of the core term.
+
+    A NormalizationError is raised if the normal form is not reached within
+    `max_steps` beta steps, which defaults to STEPS_PER_NODE times the size of
+    the term.
+    """
+    steps = _step_limit(term, max_steps)
+    # `normal` maps the ids of terms already known to be in normal form to the
+    # terms themselves. Substitution shares the subterms that it does not
+    # change, so after a beta step only the new parts of the term are visited.
+    normal = {}
+    terms = []
+    stack = [term]
+    while stack:
+        item = stack.pop()
+        if item[0] is _BUILD:
+            term = item[1]
+            if term[0] == BINDER:
+                body = terms.pop()
+                if body is not term[4]:
+                    term = _binder(term[2], term[3], body)
+            else:
+                n = len(term) - 3
+                children = terms[-n:]
+                del terms[-n:]
+                if term[2] is Call:
+                    caller, arg = children
+                    if caller[0] == BINDER and caller[2] is Lambda:
+                        steps -= 1
+                        if steps < 0:
+                            raise _too_many_steps()
+                        # The normal form of the reduced term takes the place of
+                        # the normal form of this one.
+                        stack.append(_instantiate(caller[4], arg, 0))
+                        continue
+                if any(new is not old for new, old in zip(children, term[3:])):
+                    term = _node(term[2], children)
+            normal[id(term)] = term
+            terms.append(term)
+            continue
+
+        term = item
+        tag = term[0]
+        if tag in (FREE, BOUND) or id(term) in normal:
+            terms.append(term)
+        elif tag == BINDER:
+            stack.append((_BUILD, term))
+            stack.append(term[4])
+        else:
+            stack.append((_BUILD, term))
+            stack.extend(reversed(term[3:]))
+    return terms[0]
+
+
+def normalize_by_evaluation(term, max_steps=None):
+    """Return the beta normal form of the core term, computed by evaluating it
+    into closures and reading the normal form back from the result.
+
+    Unlike `normalize`, no term is ever substituted into another: a beta step
+    just evaluates the body of the lambda in an environment that holds the
+    argument. `max_steps` is as for `normalize`.
+    """
+    # The number of steps left is shared by every call of _evaluate.
+    steps = [_step_limit(term, max_steps)]
+    return _read_back(_evaluate(term, None, steps), steps)
+
+
+def _step_limit(term, max_steps):
+    if max_steps is not None:
+        return max_steps
+    size = 0
+    seen = set()
+    stack = [term]
+    while stack:
+        term = stack.pop()
+        size += 1
+        if term[0] in (BINDER, NODE) and id(term) not in seen:
+            seen.add(id(term))
+            stack.extend(term[4:] if term[0] == BINDER else term[3:])
+    return STEPS_PER_NODE * size
+
+
+def _too_many_steps():
+    return NormalizationError('Could not simplify the formula: too many beta steps')
+
+
+# The values that core terms evaluate to are tuples, like the terms themselves.
+# The values of free names are the FREE terms themselves. The other values are:
+#
+#     (_LEVEL, level)                     -- a variable made by _read_back
+#     (_CLOSURE, cls, name, body, env)    -- a binder and its environment
+#     (_NEUTRAL, cls, children)           -- any other formula
+#
+# Unlike de Bruijn indices, the levels of variables count binders from the
+# outside in, so a value does not change when it is moved under a binder.
+_LEVEL, _CLOSURE, _NEUTRAL = range(NODE + 1, NODE + 4)
+
+
+def _evaluate(term, env, steps):
+    # `env` holds the values of the bound variables as a linked list of pairs,
+    # innermost first, so that de Bruijn index i is the i'th element.
+    values = []
+    stack = [(term, env)]
+    while stack:
+        item = stack.pop()
+        if item[0] is _BUILD:
+            cls, n = item[1:]
+            children = values[-n:]
+            del values[-n:]
+            caller = children[0]
+            if cls is Call and caller[0] == _CLOSURE and caller[1] is Lambda:
+                steps[0] -= 1
+                if steps[0] < 0:
+                    raise _too_many_steps()
+                # The value of the body takes the place of the value of the call.
+                stack.append((caller[3], (children[1], caller[4])))
+            else:
+                values.append((_NEUTRAL, cls, children))
+            continue
+
+        term, env = item
+        tag = term[0]
+        if tag == FREE:
+            values.append(term)
+        elif tag == BOUND:
+            for _ in range(term[2]):
+                env = env[1]
+            values.append(env[0])
+        elif tag == BINDER:
+            values.append((_CLOSURE, term[2], term[3], term[4], env))
+        else:
+            stack.append((_BUILD, term[2], len(term) - 3))
+            stack.extend((c, env) for c in reversed(term[3:]))
+    return values[0]
+
+
+def _read_back(value, steps):
+    terms = []
+    # `depth` is the number of binders that enclose the value.
+    stack = [(value, 0)]
+    while stack:
+        item = stack.pop()
+        if item[0] is _BUILD:
+            if item[1] == BINDER:
+                terms.append(_binder(item[2], item[3], terms.pop()))
+            else:
+                n = item[3]
+                children = terms[-n:]
+                del terms[-n:]
+                terms.append(_node(item[2], children))
+            continue
+
+        value, depth = item
+        tag = value[0]
+        if tag == FREE:
+            terms.append(value)
+        elif tag == _LEVEL:
+            terms.append(_bound(depth - 1 - value[1]))
+        elif tag == _CLOSURE:
+            cls, name, body, env = value[1:]
+            stack.append((_BUILD, BINDER, cls, name))
+            stack.append((_evaluate(body, ((_LEVEL, depth), env), steps), depth + 1))
+        else:
+            cls, children = value[1:]
+            stack.append((_BUILD, NODE, cls, len(children)))
+            stack.extend((c, depth) for c in reversed(children))
+    return terms[0]
+
+
+def _instantiate(term, value, depth):
+    """Substitute `value` for the index `depth` in `term`, and decrement the
+    indices greater than `depth`, which refer to binders outside the one that
+    is being eliminated.
+    """
+
+    def substitute(term, depth):
+        if term[1] <= depth:
+            # The term does not refer to the eliminated binder or anything
+            # outside of it.
+            return term
+        elif term[0] == BOUND:
+            index = term[2]
+            if index == depth:
+                return _shift(value, depth, 0)
+            else:
+                return _bound(index - 1)
+        else:
+            return None
+
+    return _transform(term, depth, substitute)
+
+
+def _shift(term, amount, cutoff):
+    """Add `amount` to every index in `term` that is at least `cutoff`."""
+    if amount == 0:
+        return term
+
+    def shift(term, cutoff):
+        if term[1] <= cutoff:
+            return term
+        elif term[0] == BOUND:
+            return _bound(term[2] + amount)
+        else:
+            return None
+
+    return _transform(term, cutoff, shift)
+
+
+def _transform(term, depth, function):
+    """Rebuild `term` from the top down. `function` is called on each subterm
+    along with `depth` plus the number of binders that enclose the subterm
+    within `term`, and returns either the subterm's replacement, or None to
+    rebuild the subterm from the replacements of its children.
+    """
+    terms = []
+    stack = [(term, depth)]
+    while stack:
+        item = stack.pop()
+        if item[0] is _BUILD:
+            term = item[1]
+            if term[0] == BINDER:
+                terms.append(_binder(term[2], term[3], terms.pop()))
+            else:
+                n = len(term) - 3
+                children = terms[-n:]
+                del terms[-n:]
+                terms.append(_node(term[2], children))
+            continue
+
+        term, depth = item
+        replacement = function(term, depth)
+        if replacement is not None:
+            terms.append(replacement)
+        elif term[0] == BINDER:
+            stack.append((_BUILD, term))
+            stack.append((term[4], depth + 1))
+        else:
+            stack.append((_BUILD, term))
+            stack.extend((c, depth) for c in reversed(term[3:]))
+    return terms[0]
+
+
+def _bound(index):
+    return (BOUND, index + 1, index)
+
+
+def _binder(cls, name, body):
+    return (BINDER, max(body[1] - 1, 0), cls, name, body)
+
+
+def _node(cls, children):
+    return (NODE, max(c[1] for c in children), cls) + tuple(children)
+
+
+NORMALIZERS = {'reduce': normalize, 'nbe': normalize_by_evaluation}
@@ -3,50 +3,475 @@
 Author:  Ian Fisher (iafisher@protonmail.com)
 Version: September 2018
 """
-from collections import namedtuple
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict, namedtuple
+from collections.abc import Mapping
 
+from . import __version__
 from .ast import *
-from .exceptions import CombinationError, LexiconError, ParseError, TranslationError
+from .exceptions import (
+    CombinationError,
+    LexiconError,
+    NormalizationError,
+    ParseError,
+    TranslationError,
+)
 from .parser import parse_formula, parse_type
+from .reduction import simplify_formula
 
 
-def translate_sentence(sentence, lexicon):
+def translate_sentence(sentence, lexicon, simplify='reduce', cache=None):
     """Translate `sentence`, a string containing English text, into a logical
     formula which represents its truth conditions.
 
+    Every way of combining the words of the sentence is considered (see
+    build_chart), and if there is more than one translation, the first one
+    that was found is returned.
+
+    `simplify` selects how the formula is simplified: 'reduce' for beta
+    reduction (the same as Formula.simplify) or 'nbe' for normalization by
+    evaluation. Both give the same result, but 'nbe' can be faster for
+    sentences with deeply nested determiners and coordination.
+
+    If `cache`, a TranslationCache, is given, the translation of the sentence
+    and of each of its phrases is looked up in the cache before it is computed,
+    and stored in the cache after.
+
     If the sentence cannot be translated, a TranslationError is raised.
     """
+    if cache is None:
+        terms = lookup_words(sentence, lexicon)
+        return _translate_terms(terms, build_chart(terms), simplify)
+
+    cache.check_lexicon(lexicon)
+    words = tuple(sentence.split())
+    key = (words, simplify)
+    result = cache._sentences.get(key)
+    if result is None:
+        terms = lookup_words(sentence, lexicon)
+        chart = _fill_chart(
+            [(type_id(term.type), term) for term in _anchor(terms)],
+            _add_first,
+            cache,
+            words,
+        )
+        try:
+            result = _translate_terms(terms, chart, simplify)
+        except TranslationError as e:
+            # A new exception is cached rather than `e` itself, since the
+            # traceback of `e` would keep the chart alive.
+            result = TranslationError(*e.args)
+        cache._sentences.put(key, result)
+
+    if isinstance(result, TranslationError):
+        raise TranslationError(*result.args)
+    else:
+        return result
+
+
+# The result of translating one sentence with translate_stream. Exactly one of
+# `translation` (a SentenceNode) and `error` (an exception) is None.
+TranslationResult = namedtuple('TranslationResult', ['text', 'translation', 'error'])
+
+
+def translate_stream(lines, lexicon, simplify='reduce', cache=None):
+    """Translate each line of `lines`, an iterable of strings such as a file, as
+    a sentence, and yield a TranslationResult for each one in order.
+
+    Lines are read only as the results are consumed, so that a stream of any
+    length can be translated in constant memory. Blank lines are skipped.
+    `simplify` and `cache` are as for translate_sentence.
+
+    A sentence that cannot be translated, or that contains an ill-formatted
+    lexical entry, yields a result with an error rather than stopping the
+    stream.
+    """
+    for line in lines:
+        sentence = line.strip()
+        if not sentence:
+            continue
+        try:
+            translation = translate_sentence(sentence, lexicon, simplify, cache)
+        except (LexiconError, TranslationError) as e:
+            yield TranslationResult(sentence, None, e)
+        else:
+            yield TranslationResult(sentence, translation, None)
+
+
+def _translate_terms(terms, chart, simplify):
+    translations = chart[0][len(terms)]
+    if not translations:
+        raise TranslationError(
+            'Could not translate the sentence: '
+            + 'no way to merge '
+            + ', '.join(
+                '[{} ({})]'.format(term.text, term.type.concise_str())
+                for term in _partial_translations(chart)
+            )
+        )
+
+    return _simplify_term(next(iter(translations.values())), simplify)
+
+
+def iter_translations(sentence, lexicon, simplify='reduce'):
+    """Return an iterator over every translation of `sentence`, one for each way
+    of combining its words, as simplified SentenceNode objects.
+
+    The translations are built lazily from a packed forest (see build_forest),
+    so the first few can be inspected cheaply even when there are exponentially
+    many of them. Different derivations may yield the same formula. `simplify`
+    is as for translate_sentence.
+
+    If a word in the sentence is not in the lexicon, a TranslationError is
+    raised. If the sentence cannot be translated, the iterator is empty.
+    """
+    terms = lookup_words(sentence, lexicon)
+    roots = build_forest(terms)[0][len(terms)].values()
+    return (
+        _simplify_term(term, simplify) for root in roots for term in root.iter_terms()
+    )
+
+
+def count_readings(sentence, lexicon):
+    """Return the number of translations that iter_translations would yield for
+    `sentence`, without building any of them.
+    """
+    terms = lookup_words(sentence, lexicon)
+    return sum(root.count for root in build_forest(terms)[0][len(terms)].values())
+
+
+def _simplify_term(term, simplify):
+    try:
+        if simplify == 'reduce':
+            formula = term.formula.simplify()
+        else:
+            formula = simplify_formula(term.formula, simplify)
+    except NormalizationError as e:
+        raise TranslationError(str(e))
+    return term._replace(formula=formula)
+
+
+TranslationCacheInfo = namedtuple(
+    'TranslationCacheInfo',
+    ['hits', 'misses', 'span_hits', 'span_misses', 'size', 'span_size'],
+)
+
+
+class TranslationCache:
+    """A bounded cache of translations, for translating many sentences that
+    share words and phrases (see translate_sentence).
+
+    Two things are cached: the translation (or the TranslationError) of each
+    sentence, keyed by its words and the simplification method, and each cell
+    of the chart (see build_chart) built for a sentence, keyed by the words that
+    it spans. A new sentence that contains a phrase that has been seen before
+    therefore only needs to combine the words around the phrase.
+
+    At most `maxsize` sentences and `span_maxsize` chart cells are kept, and the
+    least recently used ones are evicted first. Cached translations are only
+    valid for the lexicon they were made with, so the cache is cleared whenever
+    it is used with a different lexicon, or with one that has changed. Changes
+    to a Lexicon are tracked by its version number; any other mapping is
+    compared by its entries, which takes time proportional to its size.
+    """
+
+    def __init__(self, maxsize=1024, span_maxsize=65536):
+        self._sentences = _LRUDict(maxsize)
+        self._spans = _LRUDict(span_maxsize)
+        self._fingerprint = None
+        self._lock = threading.Lock()
+
+    def check_lexicon(self, lexicon):
+        """Clear the cache if `lexicon` is not the lexicon that the cached
+        translations were made with.
+        """
+        fingerprint = _lexicon_fingerprint(lexicon)
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                self._sentences.clear()
+                self._spans.clear()
+                self._fingerprint = fingerprint
+
+    def cache_info(self):
+        """Return a TranslationCacheInfo of the number of hits and misses for
+        sentences and for chart cells, and the number of each in the cache.
+        """
+        return TranslationCacheInfo(
+            self._sentences.hits,
+            self._sentences.misses,
+            self._spans.hits,
+            self._spans.misses,
+            len(self._sentences),
+            len(self._spans),
+        )
+
+    def clear(self):
+        """Empty the cache and reset its statistics."""
+        with self._lock:
+            self._sentences = _LRUDict(self._sentences.maxsize)
+            self._spans = _LRUDict(self._spans.maxsize)
+            self._fingerprint = None
+
+
+class _LRUDict:
+    """A mapping of at most `maxsize` items that evicts the least recently used
+    item when it is full, and counts the hits and misses of `get`.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        """Return the value of `key` and mark it as recently used, or return None
+        if it is not in the mapping.
+        """
+        with self._lock:
+            try:
+                value = self._items[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+def _lexicon_fingerprint(lexicon):
+    if isinstance(lexicon, (Lexicon, LazyLexicon)):
+        return lexicon.version
+    else:
+        return frozenset(lexicon.items())
+
+
+def lookup_words(sentence, lexicon):
+    """Return the list of the lexicon's entries for the words of `sentence`.
+
+    If a word is not in the lexicon, a TranslationError is raised.
+    """
     try:
         terms = [lexicon[word] for word in sentence.split()]
     except KeyError as e:
         raise TranslationError('Could not translate the word {}'.format(e))
+    if not terms:
+        raise TranslationError('Could not translate the empty sentence')
+    return terms
+
+
+def build_chart(terms):
+    """Build the chart of all the ways that adjacent terms can be combined (see
+    `combine`) into larger terms, by the CKY algorithm.
+
+    The chart is a list of lists such that chart[i][j], for i < j, is an
+    OrderedDict that maps the ID (see type_id) of each type that terms[i:j] can
+    be combined into to the first term of that type that was found. Since only
+    one term of each type is kept, building the chart takes time that is cubic
+    in the number of terms rather than exponential.
+    """
+    leaves = [(type_id(term.type), term) for term in _anchor(terms)]
+    return _fill_chart(leaves, _add_first)
+
+
+def _add_first(cell, left, right, result, left_is_functor):
+    # Keep only the first term of each type, for build_chart.
+    if result not in cell:
+        cell[result] = _apply(left, right, left_is_functor)
+
+
+class ForestNode:
+    """A node in a packed forest (see build_forest), which represents all the
+    ways that a span of words can be combined into a term of type `type`.
+
+    Each element of `derivations` is either a SentenceNode from the lexicon, if
+    the span is a single word, or a tuple (left, right, left_is_functor) of the
+    ForestNode objects for the two parts of the span that were combined and
+    whether the left part was applied to the right one or vice versa. Nodes are
+    shared by every derivation that they are part of. `count` is the total
+    number of derivations.
+    """
+
+    def __init__(self, type_):
+        self.type = type_
+        self.derivations = []
+        self.count = 0
+
+    def iter_terms(self):
+        """Yield the term for each derivation represented by the node, without
+        simplifying it.
+        """
+        for derivation in self.derivations:
+            if isinstance(derivation, SentenceNode):
+                yield derivation
+            else:
+                left, right, left_is_functor = derivation
+                for left_term in left.iter_terms():
+                    for right_term in right.iter_terms():
+                        yield _apply(left_term, right_term, left_is_functor)
+
+
+def build_forest(terms):
+    """Build a packed forest of all the ways that adjacent terms can be combined
+    into larger terms.
+
+    The forest is a chart like that of build_chart, except that chart[i][j]
+    maps each type ID to a ForestNode that represents every way that terms[i:j]
+    can be combined into a term of that type, rather than just the first.
+    Although the number of derivations can be exponential in the number of
+    terms, the forest is built in cubic time.
+    """
+    leaves = []
+    for term in _anchor(terms):
+        node = ForestNode(term.type)
+        node.derivations.append(term)
+        node.count = 1
+        leaves.append((type_id(term.type), node))
+
+    def add(cell, left, right, result, left_is_functor):
+        try:
+            node = cell[result]
+        except KeyError:
+            node = cell[result] = ForestNode(_types[result])
+        node.derivations.append((left, right, left_is_functor))
+        node.count += left.count * right.count
+
+    return _fill_chart(leaves, add)
+
+
+def _anchor(terms):
+    """Return copies of `terms` that share a single tuple of their words, so that
+    the terms that are built from them refer to their text by offsets into the
+    tuple rather than copying it (see _apply).
+    """
+    words = tuple(term.text for term in terms)
+    return [
+        SentenceNode.from_words(words, i, i + 1, term.formula, term.type)
+        for i, term in enumerate(terms)
+    ]
 
-    previous = len(terms)
-    while len(terms) > 1:
-        new_terms = []
-        i = 0
-        while i < len(terms) - 1:
-            try:
-                new_terms.append(combine(terms[i], terms[i + 1]))
-                i += 2
-            except CombinationError:
-                new_terms.append(terms[i])
-                i += 1
-        if i == len(terms) - 1:
-            new_terms.append(terms[i])
-        terms = new_terms
-        if len(terms) == previous:
-            raise TranslationError(
-                'Could not translate the sentence: '
-                + 'no way to merge '
-                + ', '.join(
-                    '[{} ({})]'.format(term.text, term.type.concise_str())
-                    for term in terms
-                )
-            )
-        previous = len(terms)
-    root = terms[0]._replace(formula=terms[0].formula.simplify())
-    return root
+
+def _fill_chart(leaves, add, cache=None, words=None):
+    """Fill in a chart by the CKY algorithm, for build_chart and build_forest.
+
+    `leaves` is a list of pairs of a type ID and the value to store in the chart
+    for each word. add(cell, left, right, result, left_is_functor) is called to
+    store in `cell` the combination of each pair of values that can be combined
+    into a term whose type has the ID `result` (see _combinations).
+
+    If `cache`, a TranslationCache, is given, cells are looked up in it and
+    stored in it, keyed by the slices of `words`, the tuple of the words of the
+    sentence, that they span.
+    """
+    n = len(leaves)
+    chart = [[None] * (n + 1) for _ in range(n + 1)]
+    # functors[i][j] is the index of chart[i][j] returned by _index_functors.
+    functors = [[None] * (n + 1) for _ in range(n + 1)]
+    # ends[i] is the list of each j such that chart[i][j] is not empty, in
+    # increasing order, so that empty cells are never visited.
+    ends = [[] for _ in range(n + 1)]
+    for i, (id_, value) in enumerate(leaves):
+        chart[i][i + 1] = OrderedDict([(id_, value)])
+        functors[i][i + 1] = _index_functors(chart[i][i + 1])
+        ends[i].append(i + 1)
+
+    for length in range(2, n + 1):
+        for i in range(n - length + 1):
+            j = i + length
+            cached = None if cache is None else cache._spans.get(words[i:j])
+            if cached is not None:
+                cell, functors[i][j] = cached
+            else:
+                cell = OrderedDict()
+                for combination in _combinations(chart, functors, ends, i, j):
+                    add(cell, *combination)
+                if cell:
+                    functors[i][j] = _index_functors(cell)
+                else:
+                    # Most spans cannot be combined into anything, so all empty
+                    # cells share a single dictionary to save memory.
+                    cell = _EMPTY_CELL
+                if cache is not None:
+                    cache._spans.put(words[i:j], (cell, functors[i][j]))
+            chart[i][j] = cell
+            if cell:
+                ends[i].append(j)
+    return chart
+
+
+# The shared empty cell of charts, which must never be modified.
+_EMPTY_CELL = OrderedDict()
+
+
+def _combinations(chart, functors, ends, i, j):
+    """Yield a tuple (left, right, result, left_is_functor) for each pair of a
+    value `left` of chart[i][k] and a value `right` of chart[k][j], for
+    i < k < j, that can be combined into a term whose type has the ID `result`.
+
+    The partners of each `left` are found by looking up its argument type and
+    the types that take it as an argument, rather than by trying every value of
+    chart[k][j].
+    """
+    for k in ends[i]:
+        if k >= j:
+            break
+        right_cell = chart[k][j]
+        if not right_cell:
+            continue
+
+        right_functors = functors[k][j]
+        for left_type, left in chart[i][k].items():
+            argument = _argument_ids[left_type]
+            if argument in right_cell:
+                yield left, right_cell[argument], _result_ids[left_type], True
+            for right_type in right_functors.get(left_type, ()):
+                yield left, right_cell[right_type], _result_ids[right_type], False
+
+
+def _index_functors(cell):
+    """Return a dictionary that maps each type ID to the list of the IDs in the
+    chart cell of the types that take that type as an argument.
+    """
+    index = {}
+    for type_ in cell:
+        argument = _argument_ids[type_]
+        if argument is not None:
+            index.setdefault(argument, []).append(type_)
+    return index
+
+
+def _partial_translations(chart):
+    """Return a list of terms that cover the whole sentence, each of which spans
+    as many words as possible, for error messages.
+    """
+    n = len(chart) - 1
+    terms = []
+    i = 0
+    while i < n:
+        j = max(j for j in range(i + 1, n + 1) if chart[i][j])
+        terms.append(next(iter(chart[i][j].values())))
+        i = j
+    return terms
 
 
 def combine(term1, term2):
@@ -56,18 +481,9 @@ def combine(term1, term2):
     CombinationError is raised.
     """
     if can_combine(term1, term2):
-        return SentenceNode(
-            term1.text + ' ' + term2.text,
-            Call(term1.formula, term2.formula),
-            term1.type.right,
-        )
+        return _apply(term1, term2, True)
     elif can_combine(term2, term1):
-        return SentenceNode(
-            # `text` should maintain linear order.
-            term1.text + ' ' + term2.text,
-            Call(term2.formula, term1.formula),
-            term2.type.right,
-        )
+        return _apply(term1, term2, False)
     else:
         raise CombinationError
 
@@ -77,12 +493,264 @@ def can_combine(term1, term2):
     return isinstance(term1.type, ComplexType) and term1.type.left == term2.type
 
 
-def load_lexicon(lexicon_json):
+def _apply(term1, term2, first_is_functor):
+    """Return the term for `term1` applied to `term2` if `first_is_functor` is
+    True, or for `term2` applied to `term1` if it is False, without checking
+    that the types match.
+    """
+    functor, argument = (term1, term2) if first_is_functor else (term2, term1)
+    # `text` should maintain linear order.
+    if term1.words is term2.words and term1.end == term2.start:
+        words, start, end = term1.words, term1.start, term2.end
+    else:
+        # The terms are not adjacent spans of the same sentence, so their words
+        # are copied into a new tuple.
+        words = (
+            term1.words[term1.start : term1.end] + term2.words[term2.start : term2.end]
+        )
+        start, end = 0, len(words)
+    return SentenceNode.from_words(
+        words, start, end, Call(functor.formula, argument.formula), functor.type.right
+    )
+
+
+# Semantic types are interned as small integers, so that the combination rules
+# can be checked by comparing integers rather than type trees. For each type
+# ID, _argument_ids and _result_ids hold the IDs of the left and right halves of
+# the type, or None if the type is atomic.
+_type_ids = {}
+_types = []
+_argument_ids = []
+_result_ids = []
+_types_lock = threading.Lock()
+
+
+def type_id(type_):
+    """Return the integer ID of the semantic type `type_`. Equal types have equal
+    IDs.
+    """
+    try:
+        return _type_ids[type_]
+    except KeyError:
+        with _types_lock:
+            return _intern_type(type_)
+
+
+def _intern_type(type_):
+    try:
+        return _type_ids[type_]
+    except KeyError:
+        pass
+
+    if isinstance(type_, ComplexType):
+        argument = _intern_type(type_.left)
+        result = _intern_type(type_.right)
+    else:
+        argument = result = None
+
+    id_ = len(_types)
+    _types.append(type_)
+    _argument_ids.append(argument)
+    _result_ids.append(result)
+    # The ID is published last, so that other threads never see it before the
+    # tables are filled in.
+    _type_ids[type_] = id_
+    return id_
+
+
+_lexicon_versions = itertools.count()
+
+
+class Lexicon(dict):
+    """A dictionary from words to their lexical entries (SentenceNode objects)
+    that also indexes the entries by type. `version` is changed whenever the
+    lexicon is.
+
+    load_lexicon returns a Lexicon, but any mapping from words to entries can be
+    used as a lexicon.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._invalidate()
+
+    def entries_of_type(self, type_):
+        """Return a tuple of the entries of type `type_`."""
+        return self._get_index()[0].get(type_id(type_), ())
+
+    def functors_of(self, type_):
+        """Return a tuple of the entries that can be applied to a term of type
+        `type_`.
+        """
+        return self._get_index()[1].get(type_id(type_), ())
+
+    def _get_index(self):
+        # The index is built when it is first needed after the lexicon changes.
+        index = getattr(self, '_index', None)
+        if index is None:
+            by_type = {}
+            by_argument = {}
+            for entry in self.values():
+                id_ = type_id(entry.type)
+                by_type.setdefault(id_, []).append(entry)
+                if _argument_ids[id_] is not None:
+                    by_argument.setdefault(_argument_ids[id_], []).append(entry)
+            index = self._index = (
+                {k: tuple(v) for k, v in by_type.items()},
+                {k: tuple(v) for k, v in by_argument.items()},
+            )
+        return index
+
+    def _invalidate(self):
+        self._index = None
+        # Versions are unique across all lexicons, so that a TranslationCache
+        # can tell both a different lexicon and a changed one from the one its
+        # translations were made with.
+        self.version = next(_lexicon_versions)
+
+    def __reduce__(self):
+        # The index is not pickled, since type IDs differ between processes.
+        return (self.__class__, (dict(self),))
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._invalidate()
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._invalidate()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def clear(self):
+        super().clear()
+        self._invalidate()
+
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._invalidate()
+        return value
+
+    def popitem(self):
+        item = super().popitem()
+        self._invalidate()
+        return item
+
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        self._invalidate()
+        return value
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._invalidate()
+
+
+class LazyLexicon(Mapping):
+    """A read-only mapping from words to their lexical entries that keeps the
+    lexicon's JSON and parses each entry (see load_lexical_entry) when it is
+    first looked up, so that loading the lexicon takes time proportional to the
+    number of words that are used rather than to its size.
+
+    An ill-formatted entry raises a LexiconError when it is looked up.
+    validate_all can be called to check every entry at once.
+    """
+
+    def __init__(self, lexicon_json):
+        self._source = dict(lexicon_json)
+        self._entries = {}
+        # See Lexicon._invalidate. The lexicon never changes, so its version is
+        # fixed.
+        self.version = next(_lexicon_versions)
+
+    def __getitem__(self, word):
+        try:
+            return self._entries[word]
+        except KeyError:
+            pass
+        entry = self._entries[word] = load_lexical_entry(word, self._source[word])
+        return entry
+
+    def __contains__(self, word):
+        return word in self._source
+
+    def __iter__(self):
+        return iter(self._source)
+
+    def __len__(self):
+        return len(self._source)
+
+    def validate_all(self):
+        """Parse every entry that has not been parsed yet.
+
+        If any entry is ill-formatted, a LexiconError is raised.
+        """
+        for word in self._source:
+            self[word]
+
+
+def load_lexicon(lexicon_json, lazy=False):
     """Load the lexicon from a dictionary.
 
-    If the lexicon is ill-formatted, a LexiconError is raised.
+    If `lazy` is True, a LazyLexicon is returned, which parses each entry the
+    first time it is looked up rather than all of them up front.
+
+    If the lexicon is ill-formatted, a LexiconError is raised (for a lazy
+    lexicon, when the ill-formatted entry is looked up).
+    """
+    if lazy:
+        return LazyLexicon(lexicon_json)
+    return Lexicon((k, load_lexical_entry(k, v)) for k, v in lexicon_json.items())
+
+
+def load_lexicon_file(path, cache_dir=None):
+    """Load the lexicon from the JSON file at `path` (see load_lexicon).
+
+    If `cache_dir` is given, the loaded lexicon is also pickled into that
+    directory, and later calls load the pickle instead of parsing every entry
+    again, as long as neither the JSON file nor the version of Montague has
+    changed since. A compiled lexicon that cannot be read or written is simply
+    rebuilt.
     """
-    return {k: load_lexical_entry(k, v) for k, v in lexicon_json.items()}
+    with open(path, 'rb') as f:
+        source = f.read()
+    if cache_dir is None:
+        return load_lexicon(json.loads(source.decode('utf-8')))
+
+    key = hashlib.sha256(__version__.encode('utf-8') + b'\0' + source).hexdigest()
+    # The name of the compiled lexicon includes a hash of the absolute path of
+    # the source, so that lexicons in different directories with the same name
+    # do not overwrite each other.
+    path_hash = hashlib.sha256(os.path.abspath(path).encode('utf-8')).hexdigest()
+    compiled_path = os.path.join(
+        cache_dir, '{}-{}.pickle'.format(os.path.basename(path), path_hash[:16])
+    )
+    try:
+        with open(compiled_path, 'rb') as f:
+            # The key is pickled before the lexicon, so that a stale lexicon is
+            # never unpickled.
+            if pickle.load(f) == key:
+                return pickle.load(f)
+    # A missing or corrupt file can fail in many ways, all of which just mean
+    # that the lexicon has to be compiled again.
+    except Exception:
+        pass
+
+    lexicon = load_lexicon(json.loads(source.decode('utf-8')))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file first, so that other processes never read a
+        # partially written lexicon.
+        temporary_path = '{}.{}.tmp'.format(compiled_path, os.getpid())
+        with open(temporary_path, 'wb') as f:
+            pickle.dump(key, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(lexicon, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, compiled_path)
+    except OSError:
+        pass
+    return lexicon
 
 
 def load_lexical_entry(key, value):
@@ -100,4 +768,6 @@ def load_lexical_entry(key, value):
     except ParseError as e:
         raise LexiconError('could not parse type of {} ({})'.format(key, e))
 
-    return SentenceNode(key, denotation, type_)
+    # Entries of the same type share a single type object, which saves memory
+    # and makes pickled lexicons smaller.
+    return SentenceNode(key, denotation, _types[type_id(type_)])
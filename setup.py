@@ -21,9 +21,9 @@ setup(
     },
     packages=find_packages(exclude=['tests']),
     package_data={'montague': ['resources/*json']},
-    install_requires=[
-        'lark-parser==0.6.4',
-    ],
+    extras_require={
+        'numpy': ['numpy'],
+    },
     project_urls={
         'Source': 'https://github.com/iafisher/montague',
     },
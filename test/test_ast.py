@@ -1,3 +1,11 @@
+import copy
+import gc
+import pickle
+import sys
+import weakref
+
+import pytest
+
 from montague.ast import *
 
 
@@ -122,6 +130,12 @@ def test_deeply_recursive_type_to_concise_str():
     assert typ.concise_str() == '<v, <et, et>>'
 
 
+def test_formulas_of_different_classes_are_not_equal():
+    assert And(Var('a'), Var('b')) != Or(Var('a'), Var('b'))
+    assert And(Var('a'), Var('b')) == And(Var('a'), Var('b'))
+    assert hash(Exists('x', Var('x'))) != hash(ForAll('x', Var('x')))
+
+
 def test_simple_replace_variable():
     assert Var('x').replace_variable('x', Var('y')) == Var('y')
 
@@ -167,3 +181,135 @@ def test_replace_variable_in_iota():
     tree = Iota('x', And(Var('x'), Var('y')))
     assert tree.replace_variable('x', Var('a')) == tree
     assert tree.replace_variable('y', Var('b')) == Iota('x', And(Var('x'), Var('b')))
+
+
+def test_free_variables():
+    assert Var('x').free_variables() == {'x'}
+    tree = ForAll('x', And(Call(Var('P'), Var('x')), Call(Var('Q'), Var('y'))))
+    assert tree.free_variables() == {'P', 'Q', 'y'}
+    tree = Lambda('P', Exists('y', Call(Var('P'), Var('y'))))
+    assert tree.free_variables() == set()
+    tree = Iota('x', Call(Var('R'), Var('z')))
+    assert tree.free_variables() == {'R', 'z'}
+
+
+def test_free_variables_are_cached():
+    tree = And(Var('a'), Not(Var('b')))
+    assert tree.free_variables() is tree.free_variables()
+
+
+def test_formulas_are_interned():
+    assert Var('a') is Var('a')
+    tree = ForAll('x', And(Call(Var('P'), Var('x')), Var('y')))
+    assert tree is ForAll('x', And(Call(Var('P'), Var('x')), Var('y')))
+    assert tree.body.left is Call(Var('P'), Var('x'))
+    assert Lambda(parameter='x', body=Var('x')) is Lambda('x', Var('x'))
+
+
+def test_interned_formulas_survive_pickling_and_copying():
+    tree = Iota('x', Not(Call(Var('P'), Var('x'))))
+    assert pickle.loads(pickle.dumps(tree)) is tree
+    assert copy.deepcopy(tree) is tree
+
+
+def test_formulas_are_immutable():
+    tree = And(Var('a'), Var('b'))
+    with pytest.raises(AttributeError):
+        tree.left = Var('c')
+
+
+def test_formula_constructor_checks_arguments():
+    with pytest.raises(TypeError):
+        And(Var('a'))
+    with pytest.raises(TypeError):
+        Not(Var('a'), operand=Var('b'))
+
+
+def test_unused_formulas_are_not_kept_alive():
+    tree = Var('some_unusual_variable_name')
+    ref = weakref.ref(tree)
+    del tree
+    gc.collect()
+    assert ref() is None
+
+
+def test_formula_repr():
+    assert repr(Not(Var('a'))) == "Not(operand=Var(value='a'))"
+
+
+def test_replace_variable_returns_untouched_subtrees():
+    tree = And(Call(Var('P'), Var('x')), ForAll('y', Call(Var('Q'), Var('y'))))
+    assert tree.replace_variable('z', Var('j')) is tree
+    # Bound occurrences are not replaced either.
+    assert tree.replace_variable('y', Var('j')) is tree
+    replaced = tree.replace_variable('x', Var('j'))
+    assert replaced == And(Call(Var('P'), Var('j')), tree.right)
+    assert replaced.right is tree.right
+
+
+def test_simplify_returns_normal_forms_as_they_are():
+    tree = Lambda('x', And(Call(Var('P'), Var('x')), Var('y')))
+    assert tree.simplify() is tree
+
+
+def test_simplify_shares_unchanged_subtrees():
+    unchanged = ForAll('y', Call(Var('Q'), Var('y')))
+    tree = And(Call(Lambda('x', Var('x')), Var('a')), unchanged)
+    simplified = tree.simplify()
+    assert simplified == And(Var('a'), unchanged)
+    assert simplified.right is unchanged
+    assert simplified.simplify() is simplified
+
+
+def deep_conjunction(n):
+    formula = Var('a0')
+    for i in range(1, n):
+        formula = And(Var('a{}'.format(i)), formula)
+    return formula
+
+
+def test_deep_formula_to_str():
+    n = sys.getrecursionlimit() * 2
+    expected = ' & '.join('a{}'.format(i) for i in reversed(range(n)))
+    assert str(deep_conjunction(n)) == expected
+    tree = Var('a')
+    for _ in range(n):
+        tree = Not(tree)
+    assert str(tree) == '~' * n + 'a'
+    tree = Var('F')
+    for i in range(n):
+        tree = Call(tree, Var('x'))
+    assert str(tree) == 'F({})'.format(', '.join(['x'] * n))
+
+
+def test_deep_formula_free_variables_and_replace_variable():
+    n = sys.getrecursionlimit() * 2
+    tree = deep_conjunction(n)
+    assert tree.free_variables() == {'a{}'.format(i) for i in range(n)}
+    replaced = tree.replace_variable('a0', Var('b'))
+    assert str(replaced) == str(tree)[: -len('a0')] + 'b'
+
+
+def test_sentence_node():
+    node = SentenceNode('is good', Var('g'), TYPE_ENTITY)
+    assert (node.text, node.formula, node.type) == ('is good', Var('g'), TYPE_ENTITY)
+    assert node == SentenceNode('is good', Var('g'), TYPE_ENTITY)
+    assert node != SentenceNode('is bad', Var('g'), TYPE_ENTITY)
+    assert hash(node) == hash(SentenceNode('is good', Var('g'), TYPE_ENTITY))
+    assert node._replace(formula=Var('h')).formula == Var('h')
+    assert node._replace(text='good').text == 'good'
+    assert pickle.loads(pickle.dumps(node)) == node
+    assert repr(node) == (
+        "SentenceNode(text='is good', formula=Var(value='g'), type='e')"
+    )
+    with pytest.raises(AttributeError):
+        node.text = 'is bad'
+
+
+def test_sentence_node_spans():
+    words = ('John', 'is', 'good', 'is', 'good')
+    node = SentenceNode.from_words(words, 1, 3, Var('g'), TYPE_ENTITY)
+    assert node.text == 'is good'
+    assert node == SentenceNode('is good', Var('g'), TYPE_ENTITY)
+    assert node == SentenceNode.from_words(words, 3, 5, Var('g'), TYPE_ENTITY)
+    assert node._replace(type=TYPE_TRUTH_VALUE).words is words
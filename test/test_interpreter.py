@@ -1,6 +1,27 @@
-from montague.ast import *
-from montague.interpreter import WorldModel, interpret_formula, satisfiers
+import pytest
+import itertools
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
+from montague.ast import *
+from montague.interpreter import (
+    ArrayWorldModel,
+    Relation,
+    WorldModel,
+    compile_formula,
+    interpret_across_models,
+    interpret_formula,
+    interpret_many,
+    iter_satisfiers,
+    satisfiers,
+)
+from montague.parser import parse_formula
 
 John = object()
 Mary = object()
@@ -101,3 +122,496 @@ def test_satisfiers_does_not_overwrite_assignment():
 def test_satisfiers_does_not_create_assignment():
     satisfiers(Var('j'), test_model, 'some_nonexistent_variable')
     assert 'some_nonexistent_variable' not in test_model.assignments
+
+
+def test_compile_formula():
+    evaluate = compile_formula(ForAll('x', Call(Var('Human'), Var('x'))))
+    assert evaluate(test_model)
+    assert not evaluate(WorldModel({John, Mary}, {'Human': {John}}))
+
+
+def test_compile_formula_is_cached():
+    formula = Exists('x', Call(Var('Bad'), Var('x')))
+    assert compile_formula(formula) is compile_formula(formula)
+
+
+def test_compile_formula_distinguishes_connectives():
+    conjunction = compile_formula(And(Var('j'), Var('n')))
+    disjunction = compile_formula(Or(Var('j'), Var('n')))
+    model = WorldModel(set(), {'j': True, 'n': False})
+    assert not conjunction(model)
+    assert disjunction(model)
+
+
+def test_compile_lambda_fails_only_on_evaluation():
+    evaluate = compile_formula(Lambda('x', Var('x')))
+    with pytest.raises(NotImplementedError):
+        evaluate(test_model)
+
+
+class CountingPredicate:
+    """A predicate extension that counts how many times it is queried."""
+
+    def __init__(self, members=()):
+        self.members = set(members)
+        self.lookups = 0
+
+    def __contains__(self, item):
+        self.lookups += 1
+        return item in self.members
+
+
+def test_exists_stops_at_first_witness():
+    pred = CountingPredicate(range(10))
+    model = WorldModel(list(range(10)), {'P': pred})
+    assert interpret_formula(Exists('x', Call(Var('P'), Var('x'))), model)
+    assert pred.lookups == 1
+
+
+def test_for_all_stops_at_first_counterexample():
+    pred = CountingPredicate()
+    model = WorldModel(list(range(10)), {'P': pred})
+    assert not interpret_formula(ForAll('x', Call(Var('P'), Var('x'))), model)
+    assert pred.lookups == 1
+
+
+def test_iota_stops_at_second_satisfier():
+    pred = CountingPredicate(range(10))
+    model = WorldModel(list(range(10)), {'P': pred})
+    assert interpret_formula(Iota('x', Call(Var('P'), Var('x'))), model) is None
+    assert pred.lookups == 2
+
+
+def test_iter_satisfiers_is_lazy():
+    model = WorldModel([John, Mary], {'Human': {John, Mary}})
+    it = iter_satisfiers(Call(Var('Human'), Var('x')), model, 'x')
+    assert next(it) is John
+    assert 'x' not in model.assignments
+    assert next(it) is Mary
+
+
+def test_quantifier_over_empty_domain():
+    model = WorldModel(set(), {'P': set()})
+    assert interpret_formula(ForAll('x', Call(Var('P'), Var('x'))), model)
+    assert not interpret_formula(Exists('x', Call(Var('P'), Var('x'))), model)
+
+
+planner_model = WorldModel(
+    frozenset(range(10)),
+    {
+        'Child': {1, 2, 3},
+        'Good': {1, 2, 3, 4},
+        'Bad': {5, 6},
+        'Tall': {3},
+        'Nothing': set(),
+        'j': 1,
+    },
+)
+
+
+planner_formulas = [
+    # every child is good
+    ForAll('x', IfThen(Call(Var('Child'), Var('x')), Call(Var('Good'), Var('x')))),
+    ForAll('x', IfThen(Call(Var('Good'), Var('x')), Call(Var('Child'), Var('x')))),
+    # a child is bad
+    Exists('x', And(Call(Var('Child'), Var('x')), Call(Var('Bad'), Var('x')))),
+    Exists('x', And(Call(Var('Child'), Var('x')), Not(Call(Var('Bad'), Var('x'))))),
+    Exists('x', Or(Call(Var('Nothing'), Var('x')), Call(Var('Bad'), Var('x')))),
+    ForAll('x', Or(Call(Var('Good'), Var('x')), Not(Call(Var('Good'), Var('x'))))),
+    ForAll('x', Not(Call(Var('Nothing'), Var('x')))),
+    ForAll('x', And(Call(Var('Good'), Var('x')), Call(Var('Good'), Var('j')))),
+    Exists('x', And(Call(Var('Tall'), Var('x')), Call(Var('Good'), Var('j')))),
+    Exists('x', And(Call(Var('Tall'), Var('x')), Call(Var('Bad'), Var('j')))),
+    # Bodies that can only partly be planned.
+    Exists(
+        'x',
+        And(Call(Var('Child'), Var('x')), Exists('y', Call(Var('Bad'), Var('x')))),
+    ),
+    ForAll(
+        'x',
+        IfThen(Call(Var('Bad'), Var('x')), Exists('y', Call(Var('Bad'), Var('x')))),
+    ),
+    ForAll(
+        'x',
+        IfThen(Exists('y', Call(Var('Bad'), Var('x'))), Call(Var('Good'), Var('x'))),
+    ),
+    Exists(
+        'x',
+        Or(Exists('y', Call(Var('Bad'), Var('x'))), Call(Var('Good'), Var('x'))),
+    ),
+    # A body that cannot be planned at all.
+    ForAll('x', Exists('y', Call(Var('Good'), Var('x')))),
+    # Definite descriptions.
+    Iota('x', Call(Var('Tall'), Var('x'))),
+    Iota('x', And(Call(Var('Child'), Var('x')), Not(Call(Var('Tall'), Var('x'))))),
+    Iota('x', Not(Call(Var('Good'), Var('x')))),
+    Iota('x', And(Call(Var('Bad'), Var('x')), Not(Call(Var('Good'), Var('j'))))),
+    # Chains of connectives.
+    parse_formula('Ex.Child(x) & Good(x) & ~Tall(x)'),
+    parse_formula('Ex.[Child(x) & Good(x)] & [Tall(x) & Ey.Bad(x)]'),
+    parse_formula('Ax.Child(x) -> ~Tall(x) -> Good(x)'),
+    parse_formula('Ex.Bad(x) | Tall(x) | Ey.Child(x)'),
+    parse_formula('Ax.~~Good(x) | Bad(x)'),
+    parse_formula('ix.~~~Good(x) & Bad(x) & Ey.Bad(x)'),
+]
+
+
+@pytest.mark.parametrize('formula', planner_formulas)
+def test_planned_evaluation_agrees_with_unplanned_evaluation(formula):
+    # The planner is only used when the individuals are a set.
+    unplanned_model = WorldModel(
+        sorted(planner_model.individuals), planner_model.assignments
+    )
+    assert interpret_formula(formula, planner_model) == interpret_formula(
+        formula, unplanned_model
+    )
+
+
+def test_planner_only_evaluates_unplannable_conjuncts_on_restrictor():
+    pred = CountingPredicate({2})
+    model = WorldModel(frozenset(range(100)), {'Child': {1, 2}, 'Q': pred})
+    # Ex.Child(x) & Ey.Q(x)
+    formula = Exists(
+        'x', And(Call(Var('Child'), Var('x')), Exists('y', Call(Var('Q'), Var('x'))))
+    )
+    assert interpret_formula(formula, model)
+    assert pred.lookups <= 2
+
+
+def test_planner_falls_back_when_extension_is_not_a_set():
+    pred = CountingPredicate({2})
+    model = WorldModel(frozenset(range(5)), {'Q': pred})
+    assert interpret_formula(Exists('x', Call(Var('Q'), Var('x'))), model)
+    assert pred.lookups > 0
+
+
+empty_restrictor_formulas = [
+    parse_formula('Ex.P(x) & Q(j)'),
+    parse_formula('Ax.P(x) -> G(j)'),
+    parse_formula('Ex.P(x) & Ay.G(y)'),
+]
+
+
+@pytest.mark.parametrize('formula', empty_restrictor_formulas)
+def test_planner_does_not_evaluate_constant_conjuncts_for_empty_restrictor(formula):
+    # Neither j nor G is assigned, so evaluating the conjuncts that do not
+    # mention x would fail.
+    model = WorldModel(frozenset({1, 2}), {'P': set()})
+    unplanned_model = WorldModel([1, 2], {'P': set()})
+    assert interpret_formula(formula, model) == interpret_formula(
+        formula, unplanned_model
+    )
+
+
+def test_planner_evaluates_constant_conjuncts_once():
+    pred = CountingPredicate({1})
+    model = WorldModel(frozenset(range(100)), {'Child': {1, 2}, 'Q': pred, 'j': 1})
+    assert interpret_formula(parse_formula('Ex.Child(x) & Q(j)'), model)
+    assert pred.lookups == 1
+
+
+requires_numpy = pytest.mark.skipif(numpy is None, reason='requires NumPy')
+
+
+@requires_numpy
+@pytest.mark.parametrize('formula', planner_formulas)
+def test_array_model_agrees_with_set_model(formula):
+    array_model = ArrayWorldModel(
+        sorted(planner_model.individuals), planner_model.assignments
+    )
+    assert interpret_formula(formula, array_model) == interpret_formula(
+        formula, planner_model
+    )
+
+
+@requires_numpy
+@pytest.mark.parametrize('formula', empty_restrictor_formulas)
+def test_array_model_does_not_evaluate_constant_conjuncts_for_empty_restrictor(
+    formula,
+):
+    model = ArrayWorldModel([1, 2], {'P': set()})
+    unplanned_model = WorldModel([1, 2], {'P': set()})
+    assert interpret_formula(formula, model) == interpret_formula(
+        formula, unplanned_model
+    )
+
+
+@requires_numpy
+def test_array_model_converts_predicates():
+    model = ArrayWorldModel(
+        [John, Mary],
+        {'j': John, 'Good': {John}, 'Bad': numpy.array([False, True])},
+    )
+    assert model.index == {John: 0, Mary: 1}
+    assert list(model.assignments['Good'].array) == [True, False]
+    assert set(model.assignments['Bad']) == {Mary}
+    assert model.assignments['j'] is John
+
+
+@requires_numpy
+def test_array_model_without_quantifiers():
+    model = ArrayWorldModel([John, Mary], test_model.assignments)
+    assert interpret_formula(Call(Var('Good'), Var('j')), model)
+    assert not interpret_formula(Call(Var('Bad'), Var('j')), model)
+    formula = Call(Var('Good'), Iota('x', Call(Var('Man'), Var('x'))))
+    assert interpret_formula(formula, model)
+
+
+Bob = object()
+
+relation_model = WorldModel(
+    {John, Mary, Bob},
+    {
+        'j': John,
+        'm': Mary,
+        'b': Bob,
+        'Knows': Relation([(John, Mary), (Mary, Mary), (Bob, John)]),
+        'Gives': Relation([(John, Bob, Mary)]),
+        'Human': {John, Mary, Bob},
+    },
+)
+
+
+def test_relation_lookups():
+    knows = relation_model.assignments['Knows']
+    assert knows.arity == 2
+    assert knows.apply((John, Mary))
+    assert not knows.apply((Mary, John))
+    assert knows.apply((Mary,)) == {Mary}
+    assert knows.project(0, {1: Mary}) == {John, Mary}
+    assert knows.lookup({}) == knows.tuples
+
+
+def test_relation_partial_application():
+    gives = relation_model.assignments['Gives']
+    assert gives.apply((John,)) == Relation([(Bob, Mary)])
+    assert gives.apply((John, Bob)) == {Mary}
+
+
+def test_relation_arity_mismatch():
+    with pytest.raises(ValueError):
+        Relation([(John, Mary), (John,)])
+    with pytest.raises(TypeError):
+        Relation([(John,)]).apply((John, Mary))
+
+
+@pytest.mark.parametrize(
+    'formula,expected',
+    [
+        ('Knows(j, m)', True),
+        ('Knows(m, j)', False),
+        ('Gives(j, b, m)', True),
+        ('Gives(j, m, b)', False),
+        ('Ex.Knows(j, x)', True),
+        ('Ex.Knows(x, b)', False),
+        ('Ax.Human(x) -> Knows(x, m) | Knows(x, j)', True),
+        ('Ax.Knows(x, x)', False),
+        ('Ex.Knows(x, x)', True),
+        ('Ax.Ey.Knows(x, y)', True),
+        ('Ay.Ex.Knows(x, y)', False),
+        ('Ex.Gives(j, x, m)', True),
+        ('ix.Knows(b, x)', John),
+        ('ix.Knows(x, m)', None),
+    ],
+)
+def test_relations_in_formulas(formula, expected):
+    formula = parse_formula(formula)
+    assert interpret_formula(formula, relation_model) == expected
+    # The same formula evaluated without the query planner.
+    unplanned_model = WorldModel(
+        list(relation_model.individuals), relation_model.assignments
+    )
+    assert interpret_formula(formula, unplanned_model) == expected
+
+
+def test_invariant_subformulas_are_evaluated_once():
+    pred = CountingPredicate({1})
+    model = WorldModel([1, 2, 3], {'P': pred})
+    assert interpret_formula(parse_formula('Ax.Ay.Ez.P(z)'), model)
+    # Without memoisation, Ez.P(z) would have been evaluated 9 times.
+    assert pred.lookups == 1
+
+
+def test_subformulas_are_memoised_per_assignment():
+    pred = CountingPredicate({1, 2, 3})
+    model = WorldModel([1, 2, 3], {'P': pred})
+    assert interpret_formula(parse_formula('Ax.Ay.Ez.P(x)'), model)
+    # Ez.P(x) is evaluated once for each value of x.
+    assert pred.lookups == 3
+
+
+def test_memoised_subformula_with_shadowed_variable():
+    model = WorldModel([1, 2], {'P': CountingPredicate({1}), 'Q': {2}})
+    # The inner quantifier over x depends on the inner x only.
+    formula = parse_formula('Ax.Ay.Ex.P(x) & Q(y)')
+    assert not interpret_formula(formula, model)
+    formula = parse_formula('Ex.Ey.[Ax.P(x) | Q(y)]')
+    assert interpret_formula(formula, model)
+
+
+def test_evaluation_does_not_modify_the_model():
+    # A read-only mapping would raise an error if the interpreter tried to bind
+    # the quantified variables in the model.
+    model = WorldModel(
+        [John, Mary], MappingProxyType({'Human': {John, Mary}, 'Good': {John}})
+    )
+    assert interpret_formula(parse_formula('Ax.Human(x)'), model)
+    assert not interpret_formula(parse_formula('Ax.Ey.Good(x) & Human(y)'), model)
+    assert satisfiers(Call(Var('Good'), Var('x')), model, 'x') == {John}
+
+
+def test_error_during_evaluation_leaves_model_intact():
+    model = WorldModel([John, Mary], {'Human': {John, Mary}})
+    with pytest.raises(KeyError):
+        interpret_formula(parse_formula('Ax.Human(x) -> Good(x)'), model)
+    assert model.assignments == {'Human': {John, Mary}}
+
+
+def test_concurrent_evaluation_against_one_model():
+    individuals = list(range(200))
+    model = WorldModel(
+        individuals,
+        {'Odd': {i for i in individuals if i % 2 == 1}, 'Small': set(range(10))},
+    )
+    formulas = [
+        (parse_formula('Ax.Small(x) -> Ey.Odd(y) & ~Small(y)'), True),
+        (parse_formula('Ex.Small(x) & ~Odd(x) & Ay.Small(y) -> Odd(y)'), False),
+        (parse_formula('Ax.Ey.Odd(x) | Odd(y)'), True),
+    ]
+    jobs = formulas * 20
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda job: interpret_formula(job[0], model), jobs))
+    assert results == [expected for _, expected in jobs]
+
+
+def test_interpret_many():
+    formulas = [
+        parse_formula('Good(j)'),
+        parse_formula('Ax.Human(x)'),
+        parse_formula('Bad(j)'),
+        parse_formula('ix.Man(x)'),
+    ]
+    assert interpret_many(formulas, test_model) == [True, True, False, John]
+    assert interpret_many([], test_model) == []
+
+
+def test_interpret_many_shares_closed_subformulas():
+    pred = CountingPredicate({1})
+    model = WorldModel([1, 2, 3], {'P': pred, 'Q': {1}, 'R': {2}})
+    formulas = [
+        parse_formula('Q(ix.P(x))'),
+        parse_formula('R(ix.P(x))'),
+        parse_formula('Q(ix.P(x)) & ~R(ix.P(x))'),
+        parse_formula('Ay.Q(ix.P(x))'),
+    ]
+    assert interpret_many(formulas, model) == [True, False, True, True]
+    # ix.P(x) was only evaluated once, which takes three lookups.
+    assert pred.lookups == 3
+
+
+scenarios = [
+    WorldModel(frozenset(range(5)), {'Child': {0, 1}, 'Good': good, 'j': 0})
+    for good in [{0, 1}, {1, 2}, set(), {0, 1, 2, 3, 4}, {0}]
+]
+
+
+def test_interpret_across_models_serially():
+    formula = parse_formula('Ax.Child(x) -> Good(x)')
+    assert interpret_across_models(formula, scenarios) == [
+        True,
+        False,
+        False,
+        True,
+        False,
+    ]
+
+
+def test_interpret_across_models_in_parallel():
+    formula = parse_formula('Ax.Child(x) -> Good(x)')
+    expected = interpret_across_models(formula, scenarios * 5)
+    assert (
+        interpret_across_models(formula, iter(scenarios * 5), workers=2, chunksize=3)
+        == expected
+    )
+
+
+def deep_chain(cls, operands):
+    """Return the right-nested chain of `operands` joined by `cls`, built
+    without recursion.
+    """
+    formula = operands[-1]
+    for operand in reversed(operands[:-1]):
+        formula = cls(operand, formula)
+    return formula
+
+
+def test_long_chains_of_connectives():
+    n = sys.getrecursionlimit() * 2
+    good = Call(Var('Good'), Var('j'))
+    bad = Call(Var('Bad'), Var('j'))
+    assert interpret_formula(deep_chain(And, [good] * n), test_model) is True
+    assert interpret_formula(deep_chain(And, [good] * n + [bad]), test_model) is False
+    assert interpret_formula(deep_chain(Or, [bad] * n + [good]), test_model) is True
+    assert (
+        interpret_formula(deep_chain(IfThen, [good] * n + [bad]), test_model) is False
+    )
+    negations = good
+    for _ in range(n):
+        negations = Not(negations)
+    assert interpret_formula(negations, test_model) is True
+
+
+def alternating_chain(n, first, operand, cls1=And, cls2=Or):
+    """Return [[[first & operand] | operand] & operand] | ..., with `n`
+    connectives, built without recursion.
+    """
+    formula = first
+    for i in range(n):
+        formula = (cls1 if i % 2 == 0 else cls2)(formula, operand)
+    return formula
+
+
+def test_deeply_nested_mixed_connectives():
+    n = sys.getrecursionlimit() * 2
+    good = Call(Var('Good'), Var('j'))
+    bad = Call(Var('Bad'), Var('j'))
+    assert interpret_formula(alternating_chain(n, bad, good), test_model) is True
+    assert interpret_formula(alternating_chain(n + 1, bad, bad), test_model) is False
+    formula = alternating_chain(n, good, Not(bad), IfThen, And)
+    assert interpret_formula(formula, test_model) is True
+
+
+def test_deeply_nested_mixed_connectives_in_quantifiers():
+    n = sys.getrecursionlimit() * 2
+    man = Call(Var('Man'), Var('x'))
+    body = alternating_chain(n, man, Call(Var('Human'), Var('x')))
+    assert interpret_formula(Exists('x', body), test_model)
+    assert satisfiers(body, test_model, 'x') == {John, Mary}
+
+
+def test_deeply_nested_connectives_agree_with_shallow_ones():
+    # The same formulas are compiled into closures when they are shallow and
+    # into a program when they are deep, so a deep formula is compared to the
+    # shallow formula that it is equivalent to.
+    good = Call(Var('Good'), Var('j'))
+    bad = Call(Var('Bad'), Var('j'))
+    for cls1, cls2 in itertools.product([And, Or, IfThen], repeat=2):
+        for first, operand in itertools.product([good, bad, Not(good)], repeat=2):
+            for n in [1, 2, 3]:
+                shallow = interpret_formula(
+                    alternating_chain(n, first, operand, cls1, cls2), test_model
+                )
+                # Wrapping in an even number of negations does not change the
+                # truth value, but makes the formula deep.
+                deep = alternating_chain(n, first, operand, cls1, cls2)
+                for _ in range(200):
+                    deep = And(Not(Not(deep)), Not(Not(good)))
+                assert interpret_formula(deep, test_model) == bool(shallow)
+
+
+def test_long_chains_of_connectives_in_quantifiers():
+    n = sys.getrecursionlimit() * 2
+    conjuncts = [Call(Var('Human'), Var('x'))] * n + [Call(Var('Man'), Var('x'))]
+    body = deep_chain(And, conjuncts)
+    assert interpret_formula(Iota('x', body), test_model) is John
+    assert satisfiers(body, test_model, 'x') == {John}
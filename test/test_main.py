@@ -1,9 +1,10 @@
 import pytest
+import json
 from unittest.mock import patch
 
 from montague.ast import *
-from montague.main import ShellState, execute_command, HELP_MESSAGE
-from montague.translator import TranslationError
+from montague.main import ShellState, execute_command, main, HELP_MESSAGE
+from montague.translator import TranslationCache, TranslationError
 
 
 TEST_LEXICON = {
@@ -64,6 +65,63 @@ def test_shell_display_formula(shell_state):
         assert 'Type: t' in response
 
 
+def test_shell_translation_is_cached():
+    shell_state = ShellState(lexicon=TEST_LEXICON, cache=TranslationCache())
+    first = execute_command('good', shell_state)
+    assert execute_command('good', shell_state) == first
+    assert shell_state.cache.cache_info().hits == 1
+
+
 def test_shell_unrecognized_command(shell_state):
     response = execute_command('!paraguay', shell_state)
     assert 'Unrecognized command paraguay.' == response
+
+
+def test_batch(tmp_path, capsys):
+    sentences = tmp_path / 'sentences.txt'
+    sentences.write_text('John is good\n\nevery John is bad\n')
+    output = tmp_path / 'output.jsonl'
+    with patch('montague.main.CACHE_DIR', str(tmp_path / 'cache')):
+        main(['batch', str(sentences), str(sentences), '--output', str(output)])
+
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert len(records) == 4
+    assert records[0] == {
+        'text': 'John is good',
+        'formula': 'Good(j)',
+        'type': 't',
+        'error': None,
+    }
+    assert list(records[1]) == ['text', 'formula', 'type', 'error']
+    assert records[1]['formula'] is None and records[1]['type'] is None
+    assert 'Could not translate' in records[1]['error']
+    assert 'Translated 4 sentences (2 failed)' in capsys.readouterr().err
+
+
+def test_batch_with_missing_lexicon(tmp_path, capsys):
+    with pytest.raises(SystemExit):
+        main(['batch', '--lexicon', str(tmp_path / 'lexicon.json')])
+    assert 'failed to open' in capsys.readouterr().err
+
+
+def test_batch_with_missing_input(tmp_path, capsys):
+    sentences = tmp_path / 'sentences.txt'
+    sentences.write_text('John is good\n')
+    missing = tmp_path / 'missing.txt'
+    output = tmp_path / 'output.jsonl'
+    with patch('montague.main.CACHE_DIR', str(tmp_path / 'cache')):
+        with pytest.raises(SystemExit) as e:
+            main(['batch', str(sentences), str(missing), '--output', str(output)])
+    assert e.value.code == 1
+    assert 'failed to open {}'.format(missing) in capsys.readouterr().err
+    assert len(output.read_text().splitlines()) == 1
+
+
+def test_batch_with_unopenable_output(tmp_path, capsys):
+    output = tmp_path / 'missing' / 'output.jsonl'
+    with patch('montague.main.CACHE_DIR', str(tmp_path / 'cache')):
+        with patch('fileinput.input') as input_:
+            with pytest.raises(SystemExit):
+                main(['batch', '--output', str(output)])
+    assert 'failed to open {}'.format(output) in capsys.readouterr().err
+    input_.return_value.close.assert_called_once_with()
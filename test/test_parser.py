@@ -1,9 +1,17 @@
 import pytest
 
+import os
+import subprocess
+import sys
+
+from lark.exceptions import LarkError
+
 from montague.ast import *
 from montague.exceptions import ParseError
 from montague.parser import parse_formula, parse_type
 
+from .lark_reference import formula_parser, type_parser
+
 
 def test_parsing_variable():
     assert parse_formula('a') == Var('a')
@@ -233,3 +241,143 @@ def test_parsing_type_empty_string():
 def test_parsing_type_blank():
     with pytest.raises(ParseError):
         parse_type('     \t    \n \r \f')
+
+
+# Strings on which the hand-written parsers are checked against the Lark
+# grammars. Symbols that start with L, A, E or i would be read as binders.
+FORMULAS = [
+    'a',
+    "x'",
+    'a-b',
+    'x -> y',
+    'x->y',
+    'a & b & c',
+    'a | b & c | d',
+    'a -> b <-> c',
+    '~~a & ~b',
+    '[a | b] & c',
+    '[[a]]',
+    'P(x, y, z)',
+    '(Lx.P(x))(a, b)',
+    '(x)(a)',
+    'F(x)(y)',
+    '((F))(a)',
+    'F()',
+    'P(x,)',
+    'Lx.a & b',
+    'a & Lx.b | c',
+    '~Lx.a & b',
+    'L x . x',
+    'λx.∀y.∃z.ιw.P(x, y, z, w)',
+    'Ax.Ey.R(x, y) -> ix.Good(x)',
+    'Alice',
+    'Lx.',
+    'LL.x',
+    'a[b]',
+    '(a)',
+    '[a',
+    'a]',
+    'a &',
+    '& a',
+    '',
+    '  \t\n ',
+    'a ? b',
+]
+
+TYPES = ['e', 'et', '<e, t>', '<et, <e, t>>', '< <s,v> ,t >', 'ete', 'e t']
+TYPES += ['<e>', '<e, t', 'e, t>', '<<e, t>', '', 'x', '<e, t>>']
+
+
+def test_parse_formula_matches_lark():
+    for formula in FORMULAS:
+        try:
+            expected = formula_parser.parse(formula)
+        except LarkError:
+            with pytest.raises(ParseError):
+                parse_formula(formula)
+        else:
+            assert parse_formula(formula) is expected
+
+
+def test_parse_type_matches_lark():
+    for typestring in TYPES:
+        try:
+            expected = type_parser.parse(typestring)
+        except LarkError:
+            with pytest.raises(ParseError):
+                parse_type(typestring)
+        else:
+            assert parse_type(typestring) == expected
+
+
+def test_parse_formula_round_trip_matches_lark():
+    formulas = [
+        'LP.LQ.Ax.P(x) -> Q(x)',
+        'Lp.Lq.p & q',
+        'LP.ix.P(x) & ~Bad(x) | [Good(x) <-> Good(y)]',
+        '(LP.P(a, b))(Lx.Ly.x & y)',
+    ]
+    for formula in formulas:
+        tree = parse_formula(formula)
+        for string in (str(tree), tree.ascii_str()):
+            assert parse_formula(string) is formula_parser.parse(string) is tree
+
+
+def test_parsing_deep_formulas():
+    n = sys.getrecursionlimit() * 2
+    tree = parse_formula(' & '.join(['a'] * n))
+    for _ in range(n - 1):
+        assert tree.left == Var('a')
+        tree = tree.right
+    assert tree == Var('a')
+
+    tree = parse_formula('[' * n + '~' * n + 'Lx.' * n + 'a' + ']' * n)
+    for _ in range(n):
+        tree = tree.operand
+    for _ in range(n):
+        tree = tree.body
+    assert tree == Var('a')
+
+
+def test_parsing_deep_type():
+    n = sys.getrecursionlimit() * 2
+    type_ = parse_type('<e, ' * n + 't' + '>' * n)
+    for _ in range(n):
+        type_ = type_.right
+    assert type_ == TYPE_TRUTH_VALUE
+
+
+def test_parse_formula_is_cached():
+    parse_formula.cache_clear()
+    formula = parse_formula('Lx.Cached(x)')
+    assert parse_formula('Lx.Cached(x)') is formula
+    info = parse_formula.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 1, 1)
+
+
+def test_parse_type_is_cached():
+    parse_type.cache_clear()
+    type_ = parse_type('<et, <et, t>>')
+    assert parse_type('<et, <et, t>>') is type_
+    assert parse_type.cache_info().hits == 1
+
+
+def test_parse_errors_are_not_cached():
+    parse_formula.cache_clear()
+    for _ in range(2):
+        with pytest.raises(ParseError):
+            parse_formula('a &')
+    assert parse_formula.cache_info().currsize == 0
+
+
+def test_importing_does_not_import_optional_modules():
+    # Run in a fresh interpreter, since the tests above have imported Lark.
+    code = (
+        'import sys, montague.interpreter, montague.main, montague.translator\n'
+        'assert "lark" not in sys.modules\n'
+        'assert "readline" not in sys.modules\n'
+        'assert "numpy" not in sys.modules\n'
+        'assert "multiprocessing" not in sys.modules\n'
+    )
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.check_call([sys.executable, '-c', code], cwd=project_dir)
@@ -0,0 +1,198 @@
+import pytest
+
+import sys
+
+from montague.ast import *
+from montague.exceptions import NormalizationError
+from montague.parser import parse_formula
+from montague.reduction import (
+    BINDER,
+    BOUND,
+    FREE,
+    NODE,
+    alpha_equivalent,
+    from_core,
+    normalize,
+    normalize_by_evaluation,
+    simplify_formula,
+    to_core,
+)
+
+
+def test_to_core_bound_and_free_variables():
+    term = to_core(Lambda('x', Call(Var('P'), Var('x'))))
+    assert term == (
+        BINDER,
+        0,
+        Lambda,
+        'x',
+        (NODE, 1, Call, (FREE, 0, 'P'), (BOUND, 1, 0)),
+    )
+
+
+def test_to_core_shadowed_variable():
+    term = to_core(Lambda('x', Lambda('x', Var('x'))))
+    assert term == (BINDER, 0, Lambda, 'x', (BINDER, 0, Lambda, 'x', (BOUND, 1, 0)))
+
+
+def test_to_core_indices_count_binders():
+    # Lx.Ay.R(x, y) -> L.A.R(1, 0)
+    term = to_core(parse_formula('Lx.Ay.R(x, y)'))
+    body = term[4][4]
+    assert body[3][4] == (BOUND, 2, 1)
+    assert body[4] == (BOUND, 1, 0)
+
+
+def test_core_round_trip():
+    formulas = [
+        'Lx.Ly.R(x, y)',
+        'LP.LQ.Ax.P(x) -> Q(x)',
+        'Ex.Good(x) & Ey.~Knows(x, y)',
+        'ix.Man(x) & Lx.x',
+        'Lx.Lx.x',
+    ]
+    for formula in formulas:
+        tree = parse_formula(formula)
+        assert from_core(to_core(tree)) is tree
+
+
+def test_normalize_leaves_normal_forms_unchanged():
+    term = to_core(parse_formula('Lx.Ay.R(x, y) & F(G)'))
+    assert normalize(term) is term
+
+
+def test_simplify_avoids_capture():
+    # (Lx.Ly.R(x, y))(y) -> Ly'.R(y, y'), not Ly.R(y, y)
+    tree = parse_formula('(Lx.Ly.R(x, y))(y)')
+    assert simplify_formula(tree) == parse_formula("Ly'.R(y, y')")
+
+
+def test_simplify_avoids_capture_under_quantifier():
+    # (LP.Ax.P(x) & Q(x))(Ly.Knows(y, x)) -> Ax'.Knows(x', x) & Q(x')
+    tree = parse_formula('(LP.Ax.P(x) & Q(x))(Ly.Knows(y, x))')
+    assert simplify_formula(tree) == parse_formula("Ax'.Knows(x', x) & Q(x')")
+
+
+def test_simplify_primes_until_name_is_unused():
+    tree = parse_formula("(Lx.Ly.R(x, y))(F(y, y'))")
+    assert simplify_formula(tree) == parse_formula("Ly''.R(F(y, y'), y'')")
+
+
+def test_simplify_keeps_names_that_capture_nothing():
+    # x is free elsewhere in the formula, but not in the body of Ex.
+    tree = parse_formula('Good(x) & (LP.Ex.P(x))(Bad)')
+    assert simplify_formula(tree) == parse_formula('Good(x) & Ex.Bad(x)')
+    # The inner x shadows the outer one, but the body does not refer to it.
+    tree = parse_formula('(LQ.Lx.Q(Lx.F(x)))(G)')
+    assert simplify_formula(tree) == parse_formula('Lx.G(Lx.F(x))')
+
+
+def test_simplify_shadowed_parameter():
+    # The inner x is a different variable, so it is not substituted.
+    tree = parse_formula('(Lx.Lx.x)(a)')
+    assert simplify_formula(tree) == parse_formula('Lx.x')
+
+
+def test_simplify_substitutes_under_binders():
+    # The argument refers to the outer z, which must still be bound correctly
+    # after it is moved under the binder for y.
+    tree = parse_formula('Lz.(Lx.Ly.R(x, y))(z)')
+    assert simplify_formula(tree) == parse_formula('Lz.Ly.R(z, y)')
+
+
+def test_simplify_reduces_new_redexes():
+    # (LP.P(a))(Lx.(LQ.Q(x))(Lz.Good(z))) -> Good(a)
+    tree = parse_formula('(LP.P(a))(Lx.(LQ.Q(x))(Lz.Good(z)))')
+    assert simplify_formula(tree) == parse_formula('Good(a)')
+
+
+def test_alpha_equivalent():
+    assert alpha_equivalent(
+        parse_formula('Lx.Ay.R(x, y)'), parse_formula('Lz.Aw.R(z, w)')
+    )
+    assert alpha_equivalent(parse_formula('Lx.Lx.x'), parse_formula('Lx.Ly.y'))
+    assert not alpha_equivalent(parse_formula('Lx.Ly.x'), parse_formula('Lx.Ly.y'))
+    assert not alpha_equivalent(parse_formula('Lx.P(x)'), parse_formula('Ax.P(x)'))
+    assert not alpha_equivalent(parse_formula('Lx.P(x)'), parse_formula('Ly.Q(y)'))
+    assert not alpha_equivalent(parse_formula('Lx.a'), parse_formula('Lx.x'))
+
+
+REDUCIBLE_FORMULAS = [
+    '(Lx.x)(j)',
+    '(Lx.Ly.x & y)(a, b)',
+    '(LP.P(a, b))(Lx.Ly.x & y)',
+    '(LP.LQ.Ax.P(x) -> Q(x))(Lx.Child(x))',
+    '(LP.LQ.Ax.P(x) -> Q(x))(Lx.Child(x), Ly.Good(y))',
+    '(Lx.Ly.R(x, y))(y)',
+    '(LP.Ax.P(x) & Q(x))(Ly.Knows(y, x))',
+    '(Lx.Lx.x)(a)',
+    'Lz.(Lx.Ly.R(x, y))(z)',
+    '(LP.P(a))(Lx.(LQ.Q(x))(Lz.Good(z)))',
+    '((Lx.F)(a))(b)',
+    'LQ.ix.(LP.P(x) | Q(x))(Ly.~Knows(y, z))',
+]
+
+
+def test_normalize_by_evaluation_matches_normalize():
+    for formula in REDUCIBLE_FORMULAS:
+        term = to_core(parse_formula(formula))
+        expected = from_core(normalize(term))
+        assert from_core(normalize_by_evaluation(term)) is expected
+
+
+def test_simplify_formula_with_nbe():
+    for formula in REDUCIBLE_FORMULAS:
+        tree = parse_formula(formula)
+        assert alpha_equivalent(simplify_formula(tree, 'nbe'), tree.simplify())
+
+
+def test_normalize_by_evaluation_leaves_free_variables_alone():
+    term = to_core(parse_formula('F(Lx.G(x, y))'))
+    assert from_core(normalize_by_evaluation(term)) is parse_formula('F(Lx.G(x, y))')
+
+
+def test_simplify_deep_formula():
+    # (Lx.P0(x) & P1(x) & ...)(a) -> P0(a) & P1(a) & ...
+    n = sys.getrecursionlimit() * 2
+    body = Call(Var('P0'), Var('x'))
+    expected = Call(Var('P0'), Var('a'))
+    for i in range(1, n):
+        predicate = Var('P{}'.format(i))
+        body = And(Call(predicate, Var('x')), body)
+        expected = And(Call(predicate, Var('a')), expected)
+    tree = Call(Lambda('x', body), Var('a'))
+    assert simplify_formula(tree) is expected
+    assert simplify_formula(tree, 'nbe') is expected
+
+
+def test_simplify_deep_coordination_with_nbe():
+    # and(P0, and(P1, ...))(a) -> P0(a) & P1(a) & ...
+    n = sys.getrecursionlimit() * 2
+    coordinate = parse_formula('LP.LQ.Lx.P(x) & Q(x)')
+    tree = Lambda('y', Call(Var('P0'), Var('y')))
+    expected = Call(Var('P0'), Var('a'))
+    for i in range(1, n):
+        predicate = Lambda('y', Call(Var('P{}'.format(i)), Var('y')))
+        tree = Call(Call(coordinate, predicate), tree)
+        expected = And(Call(Var('P{}'.format(i)), Var('a')), expected)
+    assert simplify_formula(Call(tree, Var('a')), 'nbe') is expected
+
+
+@pytest.mark.parametrize('method', ['reduce', 'nbe'])
+def test_simplify_term_without_normal_form(method):
+    tree = parse_formula('(Lx.x(x))(Lx.x(x))')
+    with pytest.raises(NormalizationError):
+        simplify_formula(tree, method)
+
+
+def test_normalize_with_step_limit():
+    # Two beta steps are needed.
+    term = to_core(parse_formula('(Lx.Ly.R(x, y))(a, b)'))
+    assert from_core(normalize(term, max_steps=2)) is parse_formula('R(a, b)')
+    assert from_core(normalize_by_evaluation(term, max_steps=2)) is parse_formula(
+        'R(a, b)'
+    )
+    with pytest.raises(NormalizationError):
+        normalize(term, max_steps=1)
+    with pytest.raises(NormalizationError):
+        normalize_by_evaluation(term, max_steps=1)
@@ -1,20 +1,34 @@
 import pytest
 
+import gc
+import itertools
 import json
 import os
+import pickle
+import weakref
+from unittest.mock import patch
 
 from montague.ast import *
 from montague.parser import parse_formula, parse_type
 from montague.translator import (
+    LazyLexicon,
+    Lexicon,
     LexiconError,
+    TranslationCache,
     TranslationError,
+    build_chart,
+    build_forest,
     can_combine,
     combine,
+    count_readings,
+    iter_translations,
     load_lexicon,
+    load_lexicon_file,
     translate_sentence,
+    translate_stream,
+    type_id,
 )
 
-
 TYPE_ET = ComplexType(TYPE_ENTITY, TYPE_TRUTH_VALUE)
 
 
@@ -80,17 +94,269 @@ def test_translate_the_child():
     assert node.type == TYPE_ENTITY
 
 
+def test_translate_with_nbe():
+    for sentence in ['John is good', 'every child is good', 'the child']:
+        expected = translate_sentence(sentence, TEST_LEXICON)
+        assert translate_sentence(sentence, TEST_LEXICON, simplify='nbe') == expected
+
+
+def test_translate_with_unknown_simplify_method():
+    with pytest.raises(ValueError):
+        translate_sentence('John is good', TEST_LEXICON, simplify='magic')
+
+
+def test_translate_sentence_with_non_greedy_derivation():
+    # Combining "the child" first leaves nothing for "here" to combine with.
+    lexicon = dict(
+        TEST_LEXICON,
+        here=SentenceNode(
+            'here',
+            parse_formula('LP.Lx.P(x) & Here(x)'),
+            ComplexType(TYPE_ET, TYPE_ET),
+        ),
+    )
+    node = translate_sentence('the child here', lexicon)
+    assert node.text == 'the child here'
+    assert node.formula == parse_formula('ix.Child(x) & Here(x)')
+    assert node.type == TYPE_ENTITY
+
+
+def test_translate_long_sentence():
+    lexicon = dict(
+        TEST_LEXICON,
+        very=SentenceNode('very', parse_formula('LP.P'), ComplexType(TYPE_ET, TYPE_ET)),
+    )
+    sentence = 'every child is ' + 'very ' * 40 + 'good'
+    node = translate_sentence(sentence, lexicon)
+    assert node.text == sentence
+    assert node.formula == translate_sentence('every child is good', lexicon).formula
+
+
+def test_build_chart():
+    terms = [TEST_LEXICON[word] for word in 'every child is good'.split()]
+    chart = build_chart(terms)
+    assert list(chart[0][2]) == [type_id(ComplexType(TYPE_ET, TYPE_TRUTH_VALUE))]
+    assert list(chart[2][4]) == [type_id(TYPE_ET)]
+    assert not chart[1][4]
+    assert chart[0][4][type_id(TYPE_TRUTH_VALUE)].text == 'every child is good'
+
+
+AMBIGUOUS_LEXICON = dict(
+    TEST_LEXICON,
+    here=SentenceNode(
+        'here', parse_formula('LP.Lx.P(x) & Here(x)'), ComplexType(TYPE_ET, TYPE_ET)
+    ),
+    both=SentenceNode(
+        'both',
+        parse_formula('Lp.Lq.p & q'),
+        ComplexType(TYPE_TRUTH_VALUE, ComplexType(TYPE_TRUTH_VALUE, TYPE_TRUTH_VALUE)),
+    ),
+)
+
+
+def test_iter_translations():
+    translations = list(
+        iter_translations('every child here is good', AMBIGUOUS_LEXICON)
+    )
+    # The last two derivations differ only in whether "is" applies to "good" or
+    # to "child here".
+    assert [node.formula for node in translations] == [
+        parse_formula('Ax.Child(x) -> Good(x) & Here(x)'),
+        parse_formula('Ax.[Child(x) & Here(x)] -> Good(x)'),
+        parse_formula('Ax.[Child(x) & Here(x)] -> Good(x)'),
+    ]
+    for node in translations:
+        assert node.text == 'every child here is good'
+        assert node.type == TYPE_TRUTH_VALUE
+
+
+def test_iter_translations_first_matches_translate_sentence():
+    for sentence in ['every child here is good', 'the child here', 'John is good']:
+        first = next(iter_translations(sentence, AMBIGUOUS_LEXICON))
+        assert first == translate_sentence(sentence, AMBIGUOUS_LEXICON)
+
+
+def test_iter_translations_of_untranslatable_sentence():
+    assert list(iter_translations('every John is good', TEST_LEXICON)) == []
+    with pytest.raises(TranslationError):
+        iter_translations('John is whorlious', TEST_LEXICON)
+
+
+def test_count_readings():
+    sentence = 'John is good both John is bad both John is good'
+    count = count_readings(sentence, AMBIGUOUS_LEXICON)
+    assert count == len(list(iter_translations(sentence, AMBIGUOUS_LEXICON)))
+    assert count > 1
+    assert count_readings('every John is good', TEST_LEXICON) == 0
+
+
+def test_count_readings_of_very_ambiguous_sentence():
+    sentence = ' both '.join(['John is good'] * 30)
+    # Too many readings to build, but they can be counted and the first few can
+    # be inspected.
+    assert count_readings(sentence, AMBIGUOUS_LEXICON) > 10**15
+    translations = iter_translations(sentence, AMBIGUOUS_LEXICON)
+    for node in itertools.islice(translations, 3):
+        assert node.type == TYPE_TRUTH_VALUE
+
+
+def test_build_forest_shares_subderivations():
+    terms = [AMBIGUOUS_LEXICON[word] for word in 'every child here is good'.split()]
+    forest = build_forest(terms)
+    root = forest[0][5][type_id(TYPE_TRUTH_VALUE)]
+    assert root.count == 3
+    assert forest[0][2][type_id(ComplexType(TYPE_ET, TYPE_TRUTH_VALUE))] in [
+        left for left, right, left_is_functor in root.derivations
+    ]
+
+
+def test_chart_terms_share_words():
+    terms = [TEST_LEXICON[word] for word in 'every child is good'.split()]
+    chart = build_chart(terms)
+    term = chart[0][4][type_id(TYPE_TRUTH_VALUE)]
+    assert term.text == 'every child is good'
+    assert (term.start, term.end) == (0, 4)
+    assert chart[2][4][type_id(TYPE_ET)].words is term.words
+
+
+def test_translate_stream():
+    lines = ['John is good\n', '\n', 'every John is good\n', 'John is whorlious']
+    results = list(translate_stream(lines, TEST_LEXICON))
+    assert [result.text for result in results] == [
+        'John is good',
+        'every John is good',
+        'John is whorlious',
+    ]
+    assert results[0].translation == translate_sentence('John is good', TEST_LEXICON)
+    assert results[0].error is None
+    assert results[1].translation is None
+    assert isinstance(results[1].error, TranslationError)
+    assert 'whorlious' in str(results[2].error)
+
+
+def test_translate_stream_is_lazy():
+    lines = itertools.cycle(['John is good', 'John is bad'])
+    results = translate_stream(lines, TEST_LEXICON, cache=TranslationCache())
+    texts = [result.text for result in itertools.islice(results, 5)]
+    assert texts == ['John is good', 'John is bad'] * 2 + ['John is good']
+
+
 def test_translate_invalid_sentence():
     with pytest.raises(TranslationError):
         translate_sentence('every John is good', TEST_LEXICON)
 
 
+def test_translate_invalid_sentence_error_message():
+    with pytest.raises(TranslationError) as e:
+        translate_sentence('every John is good', TEST_LEXICON)
+    assert '[every (<et, <et, t>>)], [John is good (t)]' in str(e)
+
+
+@pytest.mark.parametrize('simplify', ['reduce', 'nbe'])
+def test_translate_sentence_without_normal_form(simplify):
+    lexicon = dict(
+        TEST_LEXICON,
+        loop=SentenceNode(
+            'loop',
+            parse_formula('LP.(Lx.x(x))(Lx.x(x))'),
+            ComplexType(TYPE_ET, TYPE_ET),
+        ),
+    )
+    with pytest.raises(TranslationError):
+        translate_sentence('John is loop good', lexicon, simplify=simplify)
+
+
+def test_translate_empty_sentence():
+    with pytest.raises(TranslationError):
+        translate_sentence('', TEST_LEXICON)
+
+
 def test_translate_unknown_word():
     with pytest.raises(TranslationError) as e:
         translate_sentence('John is whorlious', TEST_LEXICON)
     assert 'whorlious' in str(e)
 
 
+def test_translate_with_cache():
+    cache = TranslationCache()
+    for _ in range(3):
+        node = translate_sentence('John is good', TEST_LEXICON, cache=cache)
+        assert node == translate_sentence('John is good', TEST_LEXICON)
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.size) == (2, 1, 1)
+
+
+def test_translate_with_cache_reuses_phrases():
+    cache = TranslationCache()
+    translate_sentence('every child is good', TEST_LEXICON, cache=cache)
+    misses = cache.cache_info().span_misses
+    node = translate_sentence('every child is bad', TEST_LEXICON, cache=cache)
+    assert node == translate_sentence('every child is bad', TEST_LEXICON)
+    info = cache.cache_info()
+    # 'every child', 'child is' and 'every child is' have been seen before, but
+    # not 'is bad', 'child is bad' or the whole sentence.
+    assert info.span_hits == 3
+    assert info.span_misses == misses + 3
+
+
+def test_translate_with_cache_caches_errors():
+    cache = TranslationCache()
+    for _ in range(2):
+        with pytest.raises(TranslationError) as e:
+            translate_sentence('every John is good', TEST_LEXICON, cache=cache)
+        assert '[every (<et, <et, t>>)], [John is good (t)]' in str(e)
+    assert cache.cache_info().hits == 1
+
+
+def test_translate_with_cache_does_not_keep_failed_chart_alive():
+    from montague.translator import _fill_chart
+
+    charts = []
+
+    def fill_chart(*args, **kwargs):
+        chart = _fill_chart(*args, **kwargs)
+        charts.append(weakref.ref(chart[0][1]))
+        return chart
+
+    cache = TranslationCache(span_maxsize=1)
+    with patch('montague.translator._fill_chart', fill_chart):
+        with pytest.raises(TranslationError):
+            translate_sentence('every John is good', TEST_LEXICON, cache=cache)
+    gc.collect()
+    assert charts[0]() is None
+
+
+def test_translation_cache_evicts_least_recently_used():
+    cache = TranslationCache(maxsize=2, span_maxsize=1)
+    for sentence in ['John is good', 'John is bad', 'John is good', 'is good']:
+        translate_sentence(sentence, TEST_LEXICON, cache=cache)
+    translate_sentence('John is good', TEST_LEXICON, cache=cache)
+    info = cache.cache_info()
+    # 'John is bad' was evicted when 'is good' was added.
+    assert (info.hits, info.misses, info.size, info.span_size) == (2, 3, 2, 1)
+    cache.clear()
+    assert cache.cache_info() == (0, 0, 0, 0, 0, 0)
+
+
+def test_translation_cache_is_cleared_when_lexicon_changes():
+    cache = TranslationCache()
+    lexicon = Lexicon(TEST_LEXICON)
+    translate_sentence('John is good', lexicon, cache=cache)
+    lexicon['good'] = SentenceNode('good', parse_formula('Lx.Nice(x)'), TYPE_ET)
+    node = translate_sentence('John is good', lexicon, cache=cache)
+    assert node.formula == parse_formula('Nice(j)')
+
+    # Plain dictionaries are compared by their contents.
+    lexicon = dict(TEST_LEXICON)
+    translate_sentence('John is good', lexicon, cache=cache)
+    translate_sentence('John is good', lexicon, cache=cache)
+    assert cache.cache_info().hits == 1
+    lexicon['good'] = SentenceNode('good', parse_formula('Lx.Nice(x)'), TYPE_ET)
+    node = translate_sentence('John is good', lexicon, cache=cache)
+    assert node.formula == parse_formula('Nice(j)')
+    assert cache.cache_info().hits == 1
+
+
 pred = SentenceNode('does', parse_formula('Lx.P(x)'), parse_type('<e, t>'))
 entity = SentenceNode('me', Var('me'), TYPE_ENTITY)
 
@@ -170,6 +436,170 @@ def test_load_lexicon():
     }
 
 
+def test_load_lexicon_returns_indexed_lexicon():
+    lexicon = load_lexicon(
+        {
+            'John': {'d': 'j', 't': 'e'},
+            'good': {'d': 'Lx.Good(x)', 't': 'et'},
+            'bad': {'d': 'Lx.Bad(x)', 't': 'et'},
+            'is': {'d': 'LP.P', 't': '<et, et>'},
+        }
+    )
+    assert isinstance(lexicon, Lexicon)
+    assert {e.text for e in lexicon.entries_of_type(TYPE_ET)} == {'good', 'bad'}
+    assert [e.text for e in lexicon.entries_of_type(TYPE_ENTITY)] == ['John']
+    assert lexicon.entries_of_type(TYPE_TRUTH_VALUE) == ()
+    assert {e.text for e in lexicon.functors_of(TYPE_ENTITY)} == {'good', 'bad'}
+    assert [e.text for e in lexicon.functors_of(TYPE_ET)] == ['is']
+
+
+def test_lexicon_index_is_updated():
+    lexicon = Lexicon(John=TEST_LEXICON['John'])
+    assert lexicon.functors_of(TYPE_ENTITY) == ()
+    lexicon['good'] = TEST_LEXICON['good']
+    assert lexicon.functors_of(TYPE_ENTITY) == (TEST_LEXICON['good'],)
+    lexicon.update(bad=TEST_LEXICON['bad'])
+    assert len(lexicon.functors_of(TYPE_ENTITY)) == 2
+    del lexicon['good']
+    lexicon.pop('bad')
+    assert lexicon.functors_of(TYPE_ENTITY) == ()
+    lexicon.clear()
+    assert lexicon.entries_of_type(TYPE_ENTITY) == ()
+
+
+def test_pickle_lexicon():
+    lexicon = Lexicon(TEST_LEXICON)
+    lexicon.entries_of_type(TYPE_ET)
+    copy = pickle.loads(pickle.dumps(lexicon))
+    assert copy == lexicon
+    assert set(copy.entries_of_type(TYPE_ET)) == set(lexicon.entries_of_type(TYPE_ET))
+
+
+def test_type_ids():
+    assert type_id(ComplexType(TYPE_ENTITY, TYPE_TRUTH_VALUE)) == type_id(TYPE_ET)
+    assert type_id(parse_type('<e, t>')) == type_id(TYPE_ET)
+    assert type_id(TYPE_ET) != type_id(ComplexType(TYPE_TRUTH_VALUE, TYPE_ENTITY))
+    assert type_id(TYPE_ENTITY) != type_id(TYPE_TRUTH_VALUE)
+
+
+def test_load_lexicon_shares_types():
+    lexicon = load_lexicon(
+        {'good': {'d': 'Lx.Good(x)', 't': 'et'}, 'bad': {'d': 'Lx.Bad(x)', 't': 'et'}}
+    )
+    assert lexicon['good'].type is lexicon['bad'].type
+
+
+LEXICON_JSON = {'John': {'d': 'j', 't': 'e'}, 'good': {'d': 'Lx.Good(x)', 't': 'et'}}
+
+
+def test_load_lexicon_file(tmp_path):
+    path = str(tmp_path / 'lexicon.json')
+    with open(path, 'w') as f:
+        json.dump(LEXICON_JSON, f)
+    assert load_lexicon_file(path) == load_lexicon(LEXICON_JSON)
+
+
+def test_load_compiled_lexicon(tmp_path):
+    path = str(tmp_path / 'lexicon.json')
+    cache_dir = str(tmp_path / 'cache')
+    with open(path, 'w') as f:
+        json.dump(LEXICON_JSON, f)
+    lexicon = load_lexicon_file(path, cache_dir=cache_dir)
+    [name] = os.listdir(cache_dir)
+    assert name.startswith('lexicon.json-') and name.endswith('.pickle')
+
+    with patch(
+        'montague.translator.load_lexicon', wraps=load_lexicon
+    ) as mock_load_lexicon:
+        assert load_lexicon_file(path, cache_dir=cache_dir) == lexicon
+        assert not mock_load_lexicon.called
+
+    # The compiled lexicon is stale once either the source or the version of
+    # Montague changes.
+    with patch('montague.translator.__version__', '0.0.0'):
+        with patch(
+            'montague.translator.load_lexicon', wraps=load_lexicon
+        ) as mock_load_lexicon:
+            load_lexicon_file(path, cache_dir=cache_dir)
+            assert mock_load_lexicon.called
+    with open(path, 'w') as f:
+        json.dump(dict(LEXICON_JSON, bad={'d': 'Lx.Bad(x)', 't': 'et'}), f)
+    assert 'bad' in load_lexicon_file(path, cache_dir=cache_dir)
+    assert 'bad' in load_lexicon_file(path, cache_dir=cache_dir)
+
+
+def test_load_corrupt_compiled_lexicon(tmp_path):
+    path = str(tmp_path / 'lexicon.json')
+    with open(path, 'w') as f:
+        json.dump(LEXICON_JSON, f)
+    cache_dir = str(tmp_path / 'cache')
+    load_lexicon_file(path, cache_dir=cache_dir)
+    for name in os.listdir(cache_dir):
+        with open(os.path.join(cache_dir, name), 'wb') as f:
+            f.write(b'garbage')
+    lexicon = load_lexicon_file(path, cache_dir=cache_dir)
+    assert lexicon == load_lexicon(LEXICON_JSON)
+    assert load_lexicon_file(path, cache_dir=cache_dir) == lexicon
+
+
+def test_load_compiled_lexicons_with_same_name(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    paths = []
+    for directory, lexicon_json in [('a', LEXICON_JSON), ('b', {}), ('c', {})]:
+        (tmp_path / directory).mkdir()
+        paths.append(str(tmp_path / directory / 'lexicon.json'))
+        with open(paths[-1], 'w') as f:
+            json.dump(lexicon_json, f)
+    # 'b' and 'c' have the same source, so they are compiled to the same lexicon
+    # but not to the same file.
+    lexicons = [load_lexicon_file(path, cache_dir=cache_dir) for path in paths]
+    assert len(os.listdir(cache_dir)) == 3
+
+    with patch(
+        'montague.translator.load_lexicon', wraps=load_lexicon
+    ) as mock_load_lexicon:
+        for path, lexicon in zip(paths, lexicons):
+            assert load_lexicon_file(path, cache_dir=cache_dir) == lexicon
+        assert not mock_load_lexicon.called
+
+
+def test_load_lazy_lexicon():
+    lexicon_json = dict(LEXICON_JSON, bad={'d': 'Lx.Bad(', 't': 'et'})
+    with patch(
+        'montague.translator.parse_formula', wraps=parse_formula
+    ) as mock_parse_formula:
+        lexicon = load_lexicon(lexicon_json, lazy=True)
+        assert isinstance(lexicon, LazyLexicon)
+        assert len(lexicon) == 3
+        assert 'bad' in lexicon and 'whorlious' not in lexicon
+        assert not mock_parse_formula.called
+
+        node = translate_sentence('good John', lexicon)
+        assert node.formula == parse_formula('Good(j)')
+        assert mock_parse_formula.call_count == 2
+        # Entries are only parsed once.
+        assert lexicon['good'] is lexicon['good']
+        assert mock_parse_formula.call_count == 2
+
+    with pytest.raises(LexiconError):
+        lexicon['bad']
+    with pytest.raises(TranslationError):
+        translate_sentence('whorlious', lexicon)
+    # A translation cache does not need to look at every entry either.
+    cache = TranslationCache()
+    assert translate_sentence('good John', lexicon, cache=cache) == node
+
+
+def test_lazy_lexicon_validate_all():
+    lexicon = load_lexicon(LEXICON_JSON, lazy=True)
+    lexicon.validate_all()
+    assert lexicon == load_lexicon(LEXICON_JSON)
+
+    lexicon = load_lexicon(dict(LEXICON_JSON, bad={'d': 'Lx.Bad(x)'}), lazy=True)
+    with pytest.raises(LexiconError):
+        lexicon.validate_all()
+
+
 def test_load_lexicon_missing_denotation_field():
     with pytest.raises(LexiconError) as e:
         load_lexicon({'John': {'t': 'e'}})
@@ -192,3 +622,9 @@ def test_load_lexicon_with_invalid_type():
     with pytest.raises(LexiconError) as e:
         load_lexicon({'John': {'d': 'j', 't': '???'}})
     assert 'John' in str(e)
+
+
+def test_simplify_call_with_reducible_caller():
+    # ((Lx.F)(a))(b) -> F(b)
+    tree = Call(Call(Lambda('x', Var('F')), Var('a')), Var('b'))
+    assert tree.simplify() == Call(Var('F'), Var('b'))